@@ -1,12 +1,19 @@
 """
 This file was taken from https://github.com/PDA-UR/DIPPID-py. Slightly adjusted by making the SensorUDP's connection
-thread a daemon thread so it will automatically stop when the main thread stops.
+thread a daemon thread so it will automatically stop when the main thread stops. Also extended by a binary packet format
+next to JSON (see dippid_sender.py for a simulated device that sends either format), batched receiving of queued UDP
+packets, immutable snapshots of the sensor values and a hub for several devices on one port.
 """
 
 import sys
 import json
-from threading import Thread
-from time import sleep
+import struct
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
+from time import sleep, perf_counter
+from types import MappingProxyType
+from typing import NamedTuple
 import signal
 
 # those modules are imported dynamically during runtime
@@ -16,18 +23,350 @@ import signal
 # import wiimote
 
 
+# Besides JSON, the sensor classes also understand a compact binary packet format that can be parsed without decoding
+# and parsing text. It is detected by its first byte, which can never start a JSON packet. Layout (little-endian):
+#   header: magic byte (0xD1), number of records (uint8)
+#   record: capability id (uint8), followed by the values of the capability:
+#       accelerometer, gravity: 3 float32 (x, y, z)
+#       rotation: 3 float32 (pitch, roll, yaw)
+#       button_N: uint8 state (0 or 1); the id is BINARY_BUTTON_ID_OFFSET + N
+#       device_id: uint8 (id 0), optional, used by SensorHub to tell several devices apart
+BINARY_PACKET_MAGIC = 0xD1
+BINARY_HEADER = struct.Struct('<BB')
+BINARY_RECORD_ID = struct.Struct('<B')
+BINARY_VECTOR = struct.Struct('<3f')
+BINARY_BUTTON = struct.Struct('<B')
+BINARY_BUTTON_ID_OFFSET = 0x80
+BINARY_DEVICE_ID_ID = 0
+# capability id -> (capability name, names of the vector components)
+BINARY_CAPABILITIES = {
+    1: ('accelerometer', ('x', 'y', 'z')),
+    2: ('gravity', ('x', 'y', 'z')),
+    3: ('rotation', ('pitch', 'roll', 'yaw')),
+}
+BINARY_CAPABILITY_IDS = {name: (capability_id, fields) for capability_id, (name, fields) in BINARY_CAPABILITIES.items()}
+# (capability name, struct, vector components or None for single values) for every possible capability id, so a record
+# can be parsed with one list lookup
+BINARY_RECORD_LAYOUTS = [None] * 0x100
+BINARY_RECORD_LAYOUTS[BINARY_DEVICE_ID_ID] = ('device_id', BINARY_BUTTON, None)
+for _capability_id, (_name, _fields) in BINARY_CAPABILITIES.items():
+    BINARY_RECORD_LAYOUTS[_capability_id] = (_name, BINARY_VECTOR, _fields)
+for _capability_id in range(BINARY_BUTTON_ID_OFFSET, 0x100):
+    BINARY_RECORD_LAYOUTS[_capability_id] = (f'button_{_capability_id - BINARY_BUTTON_ID_OFFSET}', BINARY_BUTTON, None)
+
+
+# event capabilities (the buttons) report single events instead of a continuous signal, so every change of their value
+# matters and they are never coalesced
+def is_event_capability(key):
+    return key.startswith('button_')
+
+
+def is_binary_packet(data):
+    return len(data) >= BINARY_HEADER.size and data[0] == BINARY_PACKET_MAGIC
+
+
+# returns the capabilities of a binary packet as list of (key, value) tuples
+# the values have the same form as in JSON packets, e.g. {'x': 0.1, 'y': 9.7, 'z': 0.4} or 1 for buttons
+# raises ValueError for malformed packets
+def parse_binary_packet(data):
+    _, num_records = BINARY_HEADER.unpack_from(data)
+    offset = BINARY_HEADER.size
+    values = []
+    try:
+        for _ in range(num_records):
+            layout = BINARY_RECORD_LAYOUTS[data[offset]]
+            if layout is None:
+                raise ValueError(f'unknown capability id {data[offset]} in binary packet')
+            key, record_struct, fields = layout
+            record_values = record_struct.unpack_from(data, offset + BINARY_RECORD_ID.size)
+            offset += BINARY_RECORD_ID.size + record_struct.size
+            values.append((key, dict(zip(fields, record_values)) if fields else record_values[0]))
+    except (IndexError, struct.error) as e:
+        raise ValueError('truncated binary packet') from e
+    return values
+
+
+# creates a binary packet from a dict in the same form as a JSON packet, e.g.
+# {'gravity': {'x': 0.1, 'y': 9.7, 'z': 0.4}, 'button_1': 0}
+# capabilities that have no binary representation are skipped
+def encode_binary_packet(capabilities):
+    records = []
+    for key, value in capabilities.items():
+        if key == 'device_id':
+            records.append(BINARY_RECORD_ID.pack(BINARY_DEVICE_ID_ID) + BINARY_BUTTON.pack(int(value)))
+        elif key.startswith('button_') and key[len('button_'):].isdigit():
+            button_id = BINARY_BUTTON_ID_OFFSET + int(key[len('button_'):])
+            if button_id > 0xFF:
+                continue
+            records.append(BINARY_RECORD_ID.pack(button_id) + BINARY_BUTTON.pack(int(value)))
+        elif key in BINARY_CAPABILITY_IDS:
+            capability_id, fields = BINARY_CAPABILITY_IDS[key]
+            records.append(BINARY_RECORD_ID.pack(capability_id) +
+                           BINARY_VECTOR.pack(*(float(value[field]) for field in fields)))
+    return BINARY_HEADER.pack(BINARY_PACKET_MAGIC, len(records)) + b''.join(records)
+
+
+# parses a packet in either format (JSON or binary) into (key, value) tuples
+# returns None for incomplete data
+def parse_packet(data):
+    if is_binary_packet(data):
+        try:
+            return parse_binary_packet(data)
+        except ValueError:
+            return None
+    try:
+        return json.loads(data.decode()).items()
+    except (UnicodeDecodeError, json.decoder.JSONDecodeError):
+        return None
+
+
+# waits for the first datagram on the socket, then takes everything else that is already queued without blocking
+# returns a list of (data, address) tuples, oldest first; empty if the socket has a timeout and nothing arrived
+def receive_datagrams(sock, buffer_size, max_batch_size):
+    import socket
+
+    timeout = sock.gettimeout()
+    try:
+        packets = [sock.recvfrom(buffer_size)]
+    except socket.timeout:
+        return []
+    sock.setblocking(False)
+    try:
+        while len(packets) < max_batch_size:
+            packets.append(sock.recvfrom(buffer_size))
+    except OSError:
+        # no more queued packets (BlockingIOError) or a socket error, the packets that were read are used anyway
+        pass
+    finally:
+        sock.settimeout(timeout)
+    return packets
+
+
+# immutable state of a sensor after one packet
+# a new snapshot is published for every packet, so all values of a snapshot always belong together
+class SensorSnapshot(NamedTuple):
+    # for each capability (in the order they were added) the last value; [] if no value was received yet
+    values: MappingProxyType
+    # number of the packet the snapshot was created for, increases by one for every published snapshot
+    sequence: int
+    # time.perf_counter() when the snapshot was published
+    timestamp: float
+    # time.perf_counter() when the (newest) packet of the snapshot was received, used to measure the input latency
+    receive_timestamp: float
+
+    def get_value(self, key):
+        return self.values.get(key)
+
+    def has_capability(self, key):
+        return key in self.values
+
+    def get_capabilities(self):
+        return list(self.values)
+
+
+# runs the callbacks of a sensor; this one runs them directly on the receive thread, as in the original DIPPID
+# the subclasses run them elsewhere, so slow callbacks (e.g. starting a gesture recognition) don't delay new packets
+# callbacks can be coalesced: if the callback is still waiting to run when the next value arrives, it only runs once
+# with the newest value
+# also measures the queue depth, the latency (from the arrival of the value to the start of the callback) and the
+# duration of the callbacks, see get_stats()
+class CallbackDispatcher:
+    def __init__(self):
+        self._lock = Lock()
+        # jobs of coalesced callbacks that haven't run yet, by coalesce key
+        self._pending_jobs = {}
+        # all jobs that haven't run yet, by id(job); a job that was dropped in the meantime isn't run anymore
+        self._queued_jobs = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.num_dispatched = 0
+        self.num_coalesced = 0
+        self.num_executed = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._total_duration = 0.0
+        self._max_duration = 0.0
+
+    # coalesce_key: None to run the callback for every value, otherwise a key that identifies the callback (e.g.
+    # (capability, func)) so that waiting calls are merged
+    def dispatch(self, func, value, coalesce_key=None):
+        job = self._queue_job(func, value, coalesce_key)
+        if job is not None:
+            self._run_job(job)
+
+    # stops running callbacks, pending ones are dropped
+    def shutdown(self):
+        pass
+
+    # returns the job ([func, value, enqueue time, coalesce key]) that has to be run, or None if the value was merged
+    # into a job that is already waiting
+    def _queue_job(self, func, value, coalesce_key):
+        with self._lock:
+            self.num_dispatched += 1
+            if coalesce_key is not None:
+                pending_job = self._pending_jobs.get(coalesce_key)
+                if pending_job is not None:
+                    # latest value wins, the job keeps its enqueue time so the latency includes the waiting
+                    pending_job[1] = value
+                    self.num_coalesced += 1
+                    return None
+            job = [func, value, perf_counter(), coalesce_key]
+            self._queued_jobs[id(job)] = job
+            if coalesce_key is not None:
+                self._pending_jobs[coalesce_key] = job
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            return job
+
+    # returns (func, value, enqueue time) of the job, or None if the job has already been dropped
+    def _remove_job(self, job):
+        with self._lock:
+            if self._queued_jobs.pop(id(job), None) is None:
+                return None
+            func, value, enqueue_time, coalesce_key = job
+            if coalesce_key is not None:
+                del self._pending_jobs[coalesce_key]
+            self.queue_depth -= 1
+        return func, value, enqueue_time
+
+    # drops all jobs that are waiting to run, returns how many were dropped
+    def discard_pending_jobs(self):
+        with self._lock:
+            jobs = list(self._queued_jobs.values())
+        return sum(self._remove_job(job) is not None for job in jobs)
+
+    def _run_job(self, job):
+        removed_job = self._remove_job(job)
+        if removed_job is None:
+            return
+        func, value, enqueue_time = removed_job
+        start_time = perf_counter()
+        try:
+            func(value)
+        except Exception:
+            # a broken callback shouldn't stop the receive thread or the worker
+            traceback.print_exc()
+        end_time = perf_counter()
+
+        with self._lock:
+            self.num_executed += 1
+            latency = start_time - enqueue_time
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            duration = end_time - start_time
+            self._total_duration += duration
+            self._max_duration = max(self._max_duration, duration)
+
+    def get_stats(self):
+        with self._lock:
+            num_executed = max(self.num_executed, 1)
+            return {'queue_depth': self.queue_depth, 'max_queue_depth': self.max_queue_depth,
+                    'dispatched': self.num_dispatched, 'coalesced': self.num_coalesced, 'executed': self.num_executed,
+                    'mean_latency_ms': self._total_latency / num_executed * 1000,
+                    'max_latency_ms': self._max_latency * 1000,
+                    'mean_duration_ms': self._total_duration / num_executed * 1000,
+                    'max_duration_ms': self._max_duration * 1000}
+
+
+# runs the callbacks on an executor (by default one worker thread, so they run in the order of the packets)
+class ExecutorDispatcher(CallbackDispatcher):
+    def __init__(self, executor=None):
+        CallbackDispatcher.__init__(self)
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='DIPPID-callbacks')
+
+    def dispatch(self, func, value, coalesce_key=None):
+        job = self._queue_job(func, value, coalesce_key)
+        if job is not None:
+            self._executor.submit(self._run_job, job)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# hands the callbacks over to the pygame event queue, so they run on the game loop like any other event
+# the game loop has to pass every event of event_type to handle_event()
+# events can get lost, e.g. if another event loop (like the one of a pygame_menu) takes them or the queue is cleared; a
+# coalesced job whose event hasn't been handled within LOST_EVENT_TIMEOUT is dropped, so new values get an event again
+# instead of being merged into the lost one forever; use discard_pending_jobs() when the game loop takes over again
+# requires pygame
+class PygameEventDispatcher(CallbackDispatcher):
+    # seconds
+    LOST_EVENT_TIMEOUT = 1.0
+
+    def __init__(self, event_type=None):
+        import pygame
+
+        CallbackDispatcher.__init__(self)
+        self._pygame = pygame
+        self.event_type = pygame.event.custom_type() if event_type is None else event_type
+        # callbacks that couldn't be posted because the event queue was full
+        self.num_dropped = 0
+        # coalesced callbacks that were dropped because their event got lost
+        self.num_lost = 0
+
+    def dispatch(self, func, value, coalesce_key=None):
+        if coalesce_key is not None:
+            self._drop_lost_job(coalesce_key)
+        job = self._queue_job(func, value, coalesce_key)
+        if job is None:
+            return
+        # pygame.event.post() is thread-safe; the event is tagged with the dispatcher, so an event of another one with
+        # the same event type is never run
+        try:
+            posted = self._pygame.event.post(self._pygame.event.Event(self.event_type, job=job, dispatcher=self))
+        except self._pygame.error:
+            posted = False
+        # older pygame versions return None instead of True
+        if posted is False:
+            self._remove_job(job)
+            with self._lock:
+                self.num_dropped += 1
+
+    def _drop_lost_job(self, coalesce_key):
+        with self._lock:
+            job = self._pending_jobs.get(coalesce_key)
+            # the job keeps its enqueue time while values are merged into it
+            if job is None or perf_counter() - job[2] < self.LOST_EVENT_TIMEOUT:
+                return
+        # the game loop might have run it in the meantime
+        if self._remove_job(job) is not None:
+            with self._lock:
+                self.num_lost += 1
+
+    # runs the callback of an event of event_type, call this from the game loop
+    def handle_event(self, event):
+        if getattr(event, 'dispatcher', None) is self:
+            self._run_job(event.job)
+
+    def get_stats(self):
+        stats = CallbackDispatcher.get_stats(self)
+        stats['dropped'] = self.num_dropped
+        stats['lost'] = self.num_lost
+        return stats
+
+
 class Sensor:
     # class variable that stores all instances of Sensor
     instances = []
 
     def __init__(self):
-        # list of strings which represent capabilites, such as 'buttons' or 'accelerometer'
-        self._capabilities = []
         # for each capability, store a list of callback functions
         self._callbacks = {}
-        # for each capability, store the last value as an object
-        self._data = {}
+        # (capability, callback function) of the callbacks that only need the newest value
+        self._coalesced_callbacks = set()
+        self._callback_dispatcher = CallbackDispatcher()
+        # the latest snapshot of all capabilities and their last values
+        # readers (e.g. the game loop) just take the current snapshot without locking; only the publishers (the
+        # receive thread and register_callback()) are serialized, so no update gets lost
+        self._snapshot = SensorSnapshot(MappingProxyType({}), 0, perf_counter(), perf_counter())
+        self._publish_lock = Lock()
+        # capabilities that were contained in any packet so far
+        self._received_keys = set()
+        # functions that are called with every published snapshot, see register_snapshot_listener()
+        self._snapshot_listeners = []
         self._receiving = False
+        # set by the subclasses that receive their data on a thread of their own
+        self._connection_thread = None
         Sensor.instances.append(self)
 
     # stops the loop in _receive() and kills the thread
@@ -48,59 +387,176 @@ class Sensor:
             # incomplete data
             return
 
-        for key, value in data_json.items():
-            self._add_capability(key)
+        self._apply_values(data_json.items())
 
-            # do not notify callbacks on initialization
-            if self._data[key] == []:
-                self._data[key] = value
+    # handles a raw packet as if the sensor had received it, e.g. to replay recorded packets (see dippid_replay.py)
+    def feed_packet(self, data, receive_timestamp=None):
+        self._update_raw(data, receive_timestamp)
+
+    # receives raw bytes from the sensor in either format
+    def _update_raw(self, data, receive_timestamp=None):
+        values = self._parse_raw(data)
+        if values is None:
+            return
+
+        self._apply_values(values, receive_timestamp)
+
+    # parses raw bytes from the sensor in either format into (key, value) tuples
+    # returns None for incomplete data
+    def _parse_raw(self, data):
+        return parse_packet(data)
+
+    # applies several packets (oldest first) with as few snapshots as possible: continuous capabilities (e.g. the
+    # accelerometer) only need their newest value, but every change of an event capability (see is_event_capability())
+    # ends a snapshot, so e.g. a button press and release in the same batch both reach the callbacks
+    # parse turns a packet into (key, value) tuples or None (by default packets are raw bytes)
+    # returns the number of packets that were parsed
+    def _update_coalesced(self, packets, parse=None, receive_timestamp=None):
+        parse = parse or self._parse_raw
+        # as long as nothing was received, it isn't known whether the sensor has event capabilities
+        if self._received_keys and not any(is_event_capability(key) for key in self._received_keys):
+            return self._update_newest(packets, parse, receive_timestamp)
+
+        latest_values = {}
+        for packet in packets:
+            values = parse(packet)
+            if values is None:
                 continue
+            has_event = False
+            for key, value in values:
+                if is_event_capability(key) and value != latest_values.get(key, self._snapshot.values.get(key)):
+                    has_event = True
+                latest_values[key] = value
+            if has_event:
+                self._apply_latest_values(latest_values, receive_timestamp)
+                latest_values = {}
+        self._apply_latest_values(latest_values, receive_timestamp)
+        return len(packets)
+
+    # same as _update_coalesced() for sensors without event capabilities: the packets are parsed from newest to oldest
+    # and only as long as a capability that the sensor has sent before is still missing
+    def _update_newest(self, packets, parse, receive_timestamp=None):
+        latest_values = {}
+        num_parsed = 0
+        for packet in reversed(packets):
+            values = parse(packet)
+            num_parsed += 1
+            if values is not None:
+                for key, value in values:
+                    latest_values.setdefault(key, value)
+                if self._received_keys.issubset(latest_values):
+                    break
+
+        self._apply_latest_values(latest_values, receive_timestamp)
+        return num_parsed
+
+    def _apply_latest_values(self, latest_values, receive_timestamp=None):
+        if latest_values:
+            self._received_keys.update(latest_values)
+            self._apply_values(latest_values.items(), receive_timestamp)
+
+    # stores the (key, value) tuples of one packet as new snapshot and notifies the callbacks afterwards
+    # receive_timestamp: time.perf_counter() when the packet was received, default: now
+    def _apply_values(self, values, receive_timestamp=None):
+        packet_keys = []
+        changed_keys = []
+        with self._publish_lock:
+            data = dict(self._snapshot.values)
+            for key, value in values:
+                self._add_callback_list(key)
+                packet_keys.append(key)
+
+                # do not notify callbacks on initialization
+                if data.get(key, []) == []:
+                    data[key] = value
+                    continue
 
-            # notify callbacks only if data has changed
-            if self._data[key] != value:
-                self._data[key] = value
-                self._notify_callbacks(key)
+                # notify callbacks only if data has changed
+                if data[key] != value:
+                    data[key] = value
+                    changed_keys.append(key)
+            snapshot = self._publish(data, receive_timestamp)
+
+        for func in self._snapshot_listeners:
+            func(snapshot, packet_keys)
+        for key in changed_keys:
+            self._notify_callbacks(key, snapshot.values[key])
+
+    def _publish(self, data, receive_timestamp=None):
+        timestamp = perf_counter()
+        # replacing the reference is atomic, readers see either the old or the new snapshot
+        self._snapshot = SensorSnapshot(MappingProxyType(data), self._snapshot.sequence + 1, timestamp,
+                                        timestamp if receive_timestamp is None else receive_timestamp)
+        return self._snapshot
+
+    # returns the latest snapshot of all capabilities, see SensorSnapshot
+    # the game loop should read all values of a frame from one snapshot
+    def get_snapshot(self):
+        return self._snapshot
 
     # checks if capability is available
     def has_capability(self, key):
-        return key in self._capabilities
+        return key in self._snapshot.values
 
     def _add_capability(self, key):
-        if not self.has_capability(key):
-            self._capabilities.append(key)
+        if self.has_capability(key):
+            return
+        with self._publish_lock:
+            if key not in self._snapshot.values:
+                self._add_callback_list(key)
+                data = dict(self._snapshot.values)
+                data[key] = []
+                self._publish(data)
+
+    def _add_callback_list(self, key):
+        if key not in self._callbacks:
             self._callbacks[key] = []
-            self._data[key] = []
 
     # returns a list of all current capabilities
     def get_capabilities(self):
-        return self._capabilities
+        return self._snapshot.get_capabilities()
 
     # get last value for specified capability
     def get_value(self, key):
-        try:
-            return self._data[key]
-        except KeyError:
-            # notification when trying to get values for a non-existent capability
-            # raise KeyError(f'"{key}" is not a capability of this sensor.')
-            return None
+        # notification when trying to get values for a non-existent capability
+        # raise KeyError(f'"{key}" is not a capability of this sensor.')
+        return self._snapshot.get_value(key)
 
     # register a callback function for a change in specified capability
-    def register_callback(self, key, func):
+    # coalesce: if the callback can't keep up with the values (see set_callback_dispatcher()), only the newest one is
+    # passed to it
+    def register_callback(self, key, func, coalesce=False):
         self._add_capability(key)
+        if coalesce:
+            self._coalesced_callbacks.add((key, func))
         self._callbacks[key].append(func)
 
+    # sets where the callbacks are run, see CallbackDispatcher
+    def set_callback_dispatcher(self, dispatcher):
+        self._callback_dispatcher = dispatcher
+
+    def get_callback_dispatcher(self):
+        return self._callback_dispatcher
+
+    # register a function that is called with every new snapshot and the capabilities that the packet contained
+    # (even if their values haven't changed), e.g. to record the history of the values; called on the receive thread
+    def register_snapshot_listener(self, func):
+        self._snapshot_listeners.append(func)
+
     # remove already registered callback function for specified capability
     def unregister_callback(self, key, func):
         if key in self._callbacks:
             self._callbacks[key].remove(func)
+            self._coalesced_callbacks.discard((key, func))
             return True
         else:
             # in case somebody wants to check if the callback was present before
             return False
 
-    def _notify_callbacks(self, key):
+    def _notify_callbacks(self, key, value):
         for func in self._callbacks[key]:
-            func(self._data[key])
+            coalesce_key = (key, func) if (key, func) in self._coalesced_callbacks else None
+            self._callback_dispatcher.dispatch(func, value, coalesce_key)
 
 
 # sensor connected via WiFi/UDP
@@ -108,10 +564,27 @@ class Sensor:
 # listens to all IPs by default
 # requires the socket module
 class SensorUDP(Sensor):
-    def __init__(self, port, ip='0.0.0.0'):
+    # maximum size of a datagram
+    PACKET_BUFFER_SIZE = 1024
+    # maximum number of queued datagrams that are read at once in the batched receive mode
+    MAX_BATCH_SIZE = 256
+    # seconds after which the receive thread checks if it should stop, so disconnect() doesn't block forever
+    RECEIVE_TIMEOUT = 0.5
+
+    # batched: read all datagrams that are queued when the thread wakes up and only apply the newest value of every
+    # capability, so the values never lag behind when the sensor sends faster than the packets can be handled
+    # (e.g. while a callback is running); if False, every packet is handled on its own as in the original DIPPID
+    def __init__(self, port, ip='0.0.0.0', batched=True):
         Sensor.__init__(self)
         self._ip = ip
         self._port = port
+        self._batched = batched
+        self.packets_received = 0
+        self.packets_parsed = 0
+        # packets that were superseded by a newer packet in the same batch
+        self.packets_coalesced = 0
+        self.batches_received = 0
+        self.max_batch_size = 0
         self._connect()
 
     def _connect(self):
@@ -119,53 +592,308 @@ class SensorUDP(Sensor):
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock.bind((self._ip, self._port))
+        self._sock.settimeout(self.RECEIVE_TIMEOUT)
+        # set before the thread starts, so a disconnect() right after connecting isn't overwritten
+        self._receiving = True
         # make this a daemon thread so it automatically ends when the main thread stops
-        self._connection_thread = Thread(target=self._receive, daemon=True)
+        self._connection_thread = Thread(target=self._receive_batched if self._batched else self._receive,
+                                         daemon=True)
         self._connection_thread.start()
 
+    def disconnect(self):
+        Sensor.disconnect(self)
+        self._sock.close()
+
     def _receive(self):
-        self._receiving = True
+        import socket
+
         while self._receiving:
-            data, addr = self._sock.recvfrom(1024)
             try:
-                data_decoded = data.decode()
-            except UnicodeDecodeError:
+                data, addr = self._sock.recvfrom(self.PACKET_BUFFER_SIZE)
+            except socket.timeout:
                 continue
-            self._update(data_decoded)
+            receive_timestamp = perf_counter()
+            self.packets_received += 1
+            self.packets_parsed += 1
+            self._update_raw(data, receive_timestamp)
+
+    def _receive_batched(self):
+        while self._receiving:
+            packets = receive_datagrams(self._sock, self.PACKET_BUFFER_SIZE, self.MAX_BATCH_SIZE)
+            # all packets of the batch were read at (almost) the same time
+            if packets:
+                self._update_batch([data for data, addr in packets], perf_counter())
+
+    def _update_batch(self, packets, receive_timestamp=None):
+        self.packets_received += len(packets)
+        self.packets_coalesced += len(packets) - 1
+        self.batches_received += 1
+        self.max_batch_size = max(self.max_batch_size, len(packets))
+        self.packets_parsed += self._update_coalesced(packets, receive_timestamp=receive_timestamp)
+
+    def get_receive_stats(self):
+        return {'packets_received': self.packets_received, 'packets_parsed': self.packets_parsed,
+                'packets_coalesced': self.packets_coalesced, 'batches_received': self.batches_received,
+                'max_batch_size': self.max_batch_size}
+
+
+# one of the devices of a SensorHub
+# works like any other sensor, but receives its data from the hub instead of a connection of its own
+class HubDevice(Sensor):
+    def __init__(self, device_key):
+        Sensor.__init__(self)
+        self.device_key = device_key
+
+
+# receives the data of several DIPPID devices on one UDP port with one thread
+# each device gets a sensor of its own (see get_device()), the packets are assigned to the devices by
+# - 'address': the IP address of the sender (default, works with every device)
+# - 'device_id': the device_id value in the packets (e.g. several devices behind one address); packets without one
+#   are assigned by their address
+# requires the socket module
+class SensorHub:
+    PACKET_BUFFER_SIZE = SensorUDP.PACKET_BUFFER_SIZE
+    MAX_BATCH_SIZE = SensorUDP.MAX_BATCH_SIZE
+    # packets of further unknown devices are ignored, so spoofed senders can't create sensors endlessly
+    MAX_DEVICES = 16
+    # seconds after which the receive thread checks if it should stop, so disconnect() doesn't block forever
+    RECEIVE_TIMEOUT = 0.5
+
+    def __init__(self, port, ip='0.0.0.0', demultiplex_by='address'):
+        if demultiplex_by not in ('address', 'device_id'):
+            raise ValueError(f"demultiplex_by must be 'address' or 'device_id', not '{demultiplex_by}'")
+        self._ip = ip
+        self._port = port
+        self._demultiplex_by = demultiplex_by
+        self._devices = {}
+        self._devices_lock = Lock()
+        # callback functions that are called with every new device
+        self._device_callbacks = []
+        self.packets_received = 0
+        self.packets_parsed = 0
+        self.packets_coalesced = 0
+        # packets of devices that exceeded MAX_DEVICES
+        self.packets_ignored = 0
+        self._receiving = False
+        self._connect()
+
+    def _connect(self):
+        import socket
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((self._ip, self._port))
+        self._sock.settimeout(self.RECEIVE_TIMEOUT)
+        # make this a daemon thread so it automatically ends when the main thread stops
+        self._connection_thread = Thread(target=self._receive, daemon=True)
+        self._connection_thread.start()
+
+    def disconnect(self):
+        self._receiving = False
+        if self._connection_thread:
+            self._connection_thread.join()
+        self._sock.close()
+        for device in self.get_devices().values():
+            device.disconnect()
+
+    # returns the sensor of the device with the given key (an IP address or device id), None if it hasn't sent
+    # anything yet
+    def get_device(self, device_key):
+        return self._devices.get(device_key)
+
+    # returns the sensor of the device, creates it if the device hasn't sent anything yet, e.g. to register callbacks
+    # for a known controller before the game starts
+    def add_device(self, device_key):
+        with self._devices_lock:
+            device = self._devices.get(device_key)
+            if device is None:
+                device = HubDevice(device_key)
+                self._devices[device_key] = device
+                is_new = True
+            else:
+                is_new = False
+        if is_new:
+            for func in self._device_callbacks:
+                func(device)
+        return device
+
+    # returns a dict with the sensor of every device
+    def get_devices(self):
+        return dict(self._devices)
+
+    # register a callback function that is called with the sensor of every new device (on the receive thread)
+    def register_device_callback(self, func):
+        self._device_callbacks.append(func)
+
+    def _receive(self):
+        self._receiving = True
+        while self._receiving:
+            packets = receive_datagrams(self._sock, self.PACKET_BUFFER_SIZE, self.MAX_BATCH_SIZE)
+            if packets:
+                self._update_batch(packets, perf_counter())
+
+    def _update_batch(self, packets, receive_timestamp=None):
+        self.packets_received += len(packets)
+
+        if self._demultiplex_by == 'device_id':
+            # the packets have to be parsed to find the device, so the devices get the parsed values
+            packets_by_device = {}
+            for data, addr in packets:
+                values = parse_packet(data)
+                self.packets_parsed += 1
+                if values is None:
+                    continue
+                values = dict(values)
+                device_key = values.pop('device_id', addr[0])
+                packets_by_device.setdefault(device_key, []).append(values.items())
+            for device_key, device_packets in packets_by_device.items():
+                device = self._get_or_add_device(device_key)
+                if device is None:
+                    self.packets_ignored += len(device_packets)
+                    continue
+                self.packets_coalesced += len(device_packets) - 1
+                device._update_coalesced(device_packets, parse=lambda values: values,
+                                         receive_timestamp=receive_timestamp)
+        else:
+            packets_by_device = {}
+            for data, addr in packets:
+                packets_by_device.setdefault(addr[0], []).append(data)
+            for device_key, device_packets in packets_by_device.items():
+                device = self._get_or_add_device(device_key)
+                if device is None:
+                    self.packets_ignored += len(device_packets)
+                    continue
+                self.packets_coalesced += len(device_packets) - 1
+                self.packets_parsed += device._update_coalesced(device_packets, receive_timestamp=receive_timestamp)
+
+    def _get_or_add_device(self, device_key):
+        device = self._devices.get(device_key)
+        if device is None and len(self._devices) < self.MAX_DEVICES:
+            device = self.add_device(device_key)
+        return device
+
+    def get_receive_stats(self):
+        return {'devices': len(self._devices), 'packets_received': self.packets_received,
+                'packets_parsed': self.packets_parsed, 'packets_coalesced': self.packets_coalesced,
+                'packets_ignored': self.packets_ignored}
 
 
 # sensor connected via serial connection (USB)
 # initialized with a path to a TTY (e.g. /dev/ttyUSB0)
 # default baudrate is 115200
 # requires pyserial
+# the device sends one JSON packet per line; everything that is available is read at once and split into lines, and
+# as for SensorUDP only the newest value of every capability is applied
+# if the connection is lost, the device is reopened with exponential backoff (see dippid_serial_device.py for a
+# simulated device)
 class SensorSerial(Sensor):
+    # seconds a read waits for data, so the receive thread notices disconnect() in time
+    READ_TIMEOUT = 0.1
+    # seconds between the attempts to reopen the device, doubled after every failed attempt
+    RECONNECT_MIN_DELAY = 0.1
+    RECONNECT_MAX_DELAY = 5.0
+    # longer lines are dropped, so a device that sends garbage without line breaks can't fill the memory
+    MAX_LINE_LENGTH = 4096
+
     def __init__(self, tty, baudrate=115200):
         Sensor.__init__(self)
         self._tty = tty
         self._baudrate = baudrate
+        self._serial = None
+        # received bytes that don't form a complete line yet; reused for all reads
+        self._buffer = bytearray()
+        self.bytes_received = 0
+        self.reads = 0
+        self.lines_received = 0
+        self.lines_parsed = 0
+        self.lines_dropped = 0
+        self.reconnects = 0
+        self._start_time = perf_counter()
         self._connect()
 
     def _connect(self):
+        # the first attempt is made right away, so e.g. a wrong path is reported to the caller
+        self._open()
+        # make this a daemon thread so it automatically ends when the main thread stops
+        self._connection_thread = Thread(target=self._receive, daemon=True)
+        self._connection_thread.start()
+
+    def _open(self):
         import serial
 
-        self._serial = serial.Serial(self._tty)
-        self._serial.baudrate = self._baudrate
-        self._connection_thread = Thread(target=self._receive)
-        self._connection_thread.start()
+        self._serial = serial.Serial(self._tty, baudrate=self._baudrate, timeout=self.READ_TIMEOUT)
+        self._buffer.clear()
+
+    def _close(self):
+        try:
+            self._serial.close()
+        except OSError:
+            pass
+        self._serial = None
 
     def _receive(self):
         self._receiving = True
-        try:
-            while self._receiving:
-                data = self._serial.readline()
+        reconnect_delay = self.RECONNECT_MIN_DELAY
+        while self._receiving:
+            if self._serial is None:
                 try:
-                    data_decoded = data.decode()
-                except UnicodeDecodeError:
+                    self._open()
+                    reconnect_delay = self.RECONNECT_MIN_DELAY
+                except OSError:
+                    # serial.SerialException is a subclass of OSError
+                    self._wait(reconnect_delay)
+                    reconnect_delay = min(reconnect_delay * 2, self.RECONNECT_MAX_DELAY)
                     continue
-                self._update(data)
-        except:
-            # connection lost, try again
-            self._connect()
+
+            try:
+                # blocks until at least one byte arrives (or the timeout passes), then takes all queued bytes
+                chunk = self._serial.read(self._serial.in_waiting or 1)
+            except OSError:
+                # connection lost, try again
+                self._close()
+                self.reconnects += 1
+                continue
+            if chunk:
+                self._handle_chunk(chunk, perf_counter())
+
+        if self._serial is not None:
+            self._close()
+
+    # waits for the given time, but stops early after disconnect()
+    def _wait(self, duration):
+        end_time = perf_counter() + duration
+        while self._receiving and perf_counter() < end_time:
+            sleep(min(self.READ_TIMEOUT, max(end_time - perf_counter(), 0)))
+
+    def _handle_chunk(self, chunk, receive_timestamp=None):
+        self.reads += 1
+        self.bytes_received += len(chunk)
+        self._buffer += chunk
+        end = self._buffer.rfind(b'\n')
+        lines = []
+        if end >= 0:
+            lines = [line for line in self._buffer[:end].split(b'\n') if line.strip()]
+            del self._buffer[:end + 1]
+        # an unfinished line that is already too long is dropped right away, so the buffer never grows beyond that
+        if len(self._buffer) > self.MAX_LINE_LENGTH:
+            self._buffer.clear()
+            self.lines_dropped += 1
+        if not lines:
+            return
+
+        long_lines = [line for line in lines if len(line) > self.MAX_LINE_LENGTH]
+        if long_lines:
+            self.lines_dropped += len(long_lines)
+            lines = [line for line in lines if len(line) <= self.MAX_LINE_LENGTH]
+        self.lines_received += len(lines)
+        if lines:
+            self.lines_parsed += self._update_coalesced([bytes(line) for line in lines],
+                                                        receive_timestamp=receive_timestamp)
+
+    def get_receive_stats(self):
+        duration = max(perf_counter() - self._start_time, 1e-9)
+        return {'bytes_received': self.bytes_received, 'reads': self.reads, 'lines_received': self.lines_received,
+                'lines_parsed': self.lines_parsed, 'lines_dropped': self.lines_dropped, 'reconnects': self.reconnects,
+                'bytes_per_second': self.bytes_received / duration, 'lines_per_second': self.lines_received / duration}
 
 
 # uses a Nintendo Wiimote as a sensor (connected via Bluetooth)
@@ -193,32 +921,24 @@ class SensorWiimote(Sensor):
             y = self._wiimote.accelerometer[1]
             z = self._wiimote.accelerometer[2]
             data_string = f'{{"x":{x},"y":{y},"z":{z}}}'
-            self._update('accelerometer', data_string)
+            values = [('accelerometer', data_string)]
 
             for button in buttons:
                 state = int(self._wiimote.buttons[button])
-                self._update(f'button_' + button.lower(), state)
+                values.append((f'button_' + button.lower(), state))
+            # all values that were polled together are published as one snapshot
+            self._apply_values(values)
             sleep(0.001)
 
-    def _update(self, key, value):
-        self._add_capability(key)
-        
-        # do not notify callbacks on initialization
-        if self._data[key] == []:
-            self._data[key] = value
-            return
-
-        # notify callbacks only if data has changed
-        if self._data[key] != value:
-            self._data[key] = value
-            self._notify_callbacks(key)
-
 
 # close the program softly when ctrl+c is pressed
 def handle_interrupt_signal(signal, frame):
-    for sensor in Sensor.instances:
+    for sensor in list(Sensor.instances):
         sensor.disconnect()
     sys.exit(0)
 
 
-signal.signal(signal.SIGINT, handle_interrupt_signal)
+# makes ctrl+c disconnect all sensors and exit the program, e.g. for the game
+# not done on import, so programs that handle KeyboardInterrupt themselves (e.g. dippid_replay.py) keep doing so
+def install_interrupt_handler():
+    signal.signal(signal.SIGINT, handle_interrupt_signal)
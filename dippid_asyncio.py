@@ -0,0 +1,241 @@
+"""
+Asyncio based transports for DIPPID sensors. Instead of one thread with a blocking receive loop per sensor (see
+DIPPID.py), all sensors are served by one event loop and can be closed at any time without waiting for a packet.
+
+Within asyncio code:
+    sensor = SensorUDPAsync(5700)
+    await sensor.start()
+    async for snapshot in sensor.samples():
+        print(snapshot.get_value('gravity'))
+    await sensor.close()
+
+From synchronous code such as the game, the event loop runs on one background thread:
+    sensor_loop = SensorEventLoop()
+    sensor = sensor_loop.add_sensor(SensorUDPAsync(5700))
+    ...
+    sensor_loop.close()
+"""
+
+import asyncio
+import concurrent.futures
+from threading import Thread, get_ident
+from time import perf_counter
+from DIPPID import Sensor
+
+# this module is imported dynamically during runtime, only if SensorSerialAsync is used
+# import serial_asyncio
+
+
+# base class for sensors that are fed by an asyncio transport
+# values, snapshots and callbacks work the same way as for the other sensors; the callbacks are run on the event loop
+class AsyncSensor(Sensor):
+
+    def __init__(self):
+        Sensor.__init__(self)
+        # there is no connection thread, the sensor is served by the event loop
+        self._connection_thread = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._tasks = []
+        # set and replaced whenever a new snapshot is published, used by samples() to wait for the next snapshot
+        self._snapshot_event = None
+
+    # opens the transport on the running event loop
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = get_ident()
+        self._snapshot_event = asyncio.Event()
+        self._receiving = True
+        await self._open()
+
+    async def _open(self):
+        raise NotImplementedError
+
+    def _close_transport(self):
+        for task in self._tasks:
+            task.cancel()
+
+    # closes the transport and waits until all of its tasks have finished
+    async def close(self):
+        self._receiving = False
+        self._close_transport()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wake_waiters()
+        if self in Sensor.instances:
+            Sensor.instances.remove(self)
+
+    # synchronous version of close() that can be called from any thread (e.g. the ctrl+c handler)
+    # returns immediately, the transport is closed on the event loop shortly afterwards
+    def disconnect(self):
+        if self in Sensor.instances:
+            Sensor.instances.remove(self)
+        if self._loop is None or self._loop.is_closed():
+            return
+        if get_ident() == self._loop_thread_id:
+            self._loop.create_task(self.close())
+        else:
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self.close()))
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _publish(self, data, receive_timestamp=None):
+        snapshot = Sensor._publish(self, data, receive_timestamp)
+        if self._loop is not None and not self._loop.is_closed():
+            if get_ident() == self._loop_thread_id:
+                self._wake_waiters()
+            else:
+                # e.g. register_callback() from another thread
+                self._loop.call_soon_threadsafe(self._wake_waiters)
+        return snapshot
+
+    def _wake_waiters(self):
+        if self._snapshot_event is None:
+            return
+        snapshot_event, self._snapshot_event = self._snapshot_event, asyncio.Event()
+        snapshot_event.set()
+
+    # async iterator over the snapshots of the sensor, ends when the sensor is closed
+    # if the consumer is slower than the sensor, the snapshots in between are skipped, so the consumer always gets the
+    # newest one
+    # raises RuntimeError if the sensor hasn't been started yet
+    async def samples(self):
+        if self._snapshot_event is None:
+            raise RuntimeError('the sensor has to be started (await sensor.start()) before iterating its samples')
+        last_sequence = self._snapshot.sequence
+        while self._receiving:
+            snapshot_event = self._snapshot_event
+            snapshot = self._snapshot
+            if snapshot.sequence == last_sequence:
+                await snapshot_event.wait()
+                continue
+            last_sequence = snapshot.sequence
+            yield snapshot
+
+
+class _DIPPIDDatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, sensor):
+        self._sensor = sensor
+
+    def datagram_received(self, data, addr):
+        self._sensor._update_raw(data, perf_counter())
+
+    def error_received(self, exc):
+        # e.g. an ICMP error of an earlier send, the socket can still be used
+        pass
+
+
+# asyncio version of SensorUDP
+# initialized with a UDP port, listens to all IPs by default
+class SensorUDPAsync(AsyncSensor):
+
+    def __init__(self, port, ip='0.0.0.0'):
+        AsyncSensor.__init__(self)
+        self._ip = ip
+        self._port = port
+        self._transport = None
+
+    async def _open(self):
+        self._transport, _ = await self._loop.create_datagram_endpoint(lambda: _DIPPIDDatagramProtocol(self),
+                                                                       local_addr=(self._ip, self._port))
+
+    def _close_transport(self):
+        AsyncSensor._close_transport(self)
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+# asyncio version of SensorSerial
+# initialized with a path to a TTY (e.g. /dev/ttyUSB0)
+# requires pyserial-asyncio
+class SensorSerialAsync(AsyncSensor):
+    # seconds to wait before trying to reopen the serial device after the connection was lost
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, tty, baudrate=115200):
+        AsyncSensor.__init__(self)
+        self._tty = tty
+        self._baudrate = baudrate
+
+    async def _open(self):
+        self._tasks.append(self._loop.create_task(self._read_lines()))
+
+    async def _read_lines(self):
+        import serial_asyncio
+
+        while self._receiving:
+            try:
+                reader, writer = await serial_asyncio.open_serial_connection(url=self._tty, baudrate=self._baudrate)
+            except OSError:
+                # the device isn't available (yet), serial.SerialException is a subclass of OSError
+                await asyncio.sleep(self.RECONNECT_DELAY)
+                continue
+
+            try:
+                while self._receiving:
+                    line = await reader.readline()
+                    if not line:
+                        # end of file, the device was disconnected
+                        break
+                    self._update_raw(line, perf_counter())
+            except OSError:
+                # connection lost, try again
+                pass
+            finally:
+                writer.close()
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+
+# runs an asyncio event loop on a background thread, so synchronous code (e.g. the game) can use the asyncio sensors
+# all sensors share the one thread
+class SensorEventLoop:
+    # seconds to wait for the sensors to open and close
+    TIMEOUT = 2.0
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._sensors = []
+        # make this a daemon thread so it automatically ends when the main thread stops
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    # starts the sensor on the event loop and returns it
+    # raises the error of the transport, e.g. an OSError if the port is already in use
+    def add_sensor(self, sensor):
+        asyncio.run_coroutine_threadsafe(sensor.start(), self._loop).result(self.TIMEOUT)
+        self._sensors.append(sensor)
+        return sensor
+
+    def remove_sensor(self, sensor):
+        self._sensors.remove(sensor)
+        self._run_with_timeout(sensor.close())
+
+    # closes all sensors and stops the event loop; never blocks longer than TIMEOUT per step, even if a device doesn't
+    # send anything anymore
+    def close(self):
+        if self._loop.is_closed():
+            return
+
+        self._run_with_timeout(self._close_sensors())
+        self._sensors = []
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(self.TIMEOUT)
+        if not self._thread.is_alive():
+            self._loop.close()
+
+    async def _close_sensors(self):
+        await asyncio.gather(*(sensor.close() for sensor in self._sensors), return_exceptions=True)
+
+    def _run_with_timeout(self, coroutine):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        try:
+            future.result(self.TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
@@ -0,0 +1,162 @@
+"""
+Timestamped history of DIPPID sensor values. A sensor only keeps the last value of every capability, so the history
+records every received value in a fixed-size ring buffer per capability. The game can then smooth or extrapolate the
+tilt instead of applying the raw value of the latest packet, and the recorded samples can be used to analyze jitter.
+
+    history = SensorHistory(sensor)
+    timestamps, values = history.get_window('gravity', 50)
+    tilt = history.get_filtered('gravity', 'x')
+"""
+
+from threading import Lock
+from time import perf_counter
+import numpy as np
+
+
+# fixed-size ring buffer of (timestamp, values) samples
+# every sample is stored twice (at i and i + capacity), so the latest n samples are always one contiguous slice and can
+# be returned as views without copying; appending is O(1)
+class SampleRingBuffer:
+
+    def __init__(self, capacity, num_values):
+        self.capacity = capacity
+        self.num_values = num_values
+        self._timestamps = np.zeros(2 * capacity)
+        self._values = np.zeros((2 * capacity, num_values))
+        # position of the next sample in the first half of the arrays
+        self._next_index = 0
+        self._num_samples = 0
+
+    def append(self, timestamp, values):
+        i = self._next_index
+        self._timestamps[i] = self._timestamps[i + self.capacity] = timestamp
+        self._values[i] = self._values[i + self.capacity] = values
+        self._next_index = (i + 1) % self.capacity
+        self._num_samples = min(self._num_samples + 1, self.capacity)
+
+    def __len__(self):
+        return self._num_samples
+
+    # returns views of the timestamps (n,) and values (n, num_values) of the latest n samples, oldest first
+    # the views are overwritten once further samples arrive, so copy them if they are kept
+    def get_window(self, num_samples=None):
+        num_samples = self._num_samples if num_samples is None else min(num_samples, self._num_samples)
+        end = self._next_index + self.capacity
+        return self._timestamps[end - num_samples:end], self._values[end - num_samples:end]
+
+    # same as get_window() for all samples that are not older than the given time
+    def get_window_since(self, start_time):
+        timestamps, values = self.get_window()
+        start = np.searchsorted(timestamps, start_time)
+        return timestamps[start:], values[start:]
+
+    # returns the values at the given times (e.g. the frame times) with shape (len(times), num_values), linearly
+    # interpolated between the samples; before the first and after the last sample the values are held
+    def resample(self, times):
+        timestamps, values = self.get_window()
+        times = np.asarray(times, dtype=float)
+        if len(timestamps) == 0:
+            return np.full((len(times), self.num_values), np.nan)
+        return np.column_stack([np.interp(times, timestamps, values[:, j]) for j in range(self.num_values)])
+
+    # fits a line through the samples of the last window_duration seconds (least squares) and returns its values at
+    # the given time; this smooths the values and, for a time after the last sample, extrapolates them
+    # returns None if there are no samples
+    def get_filtered(self, time, window_duration, max_extrapolation):
+        timestamps, values = self.get_window()
+        if len(timestamps) == 0:
+            return None
+        timestamps, values = self.get_window_since(timestamps[-1] - window_duration)
+        if len(timestamps) < 2 or timestamps[-1] - timestamps[0] <= 0:
+            return values[-1].copy()
+
+        # relative to the mean time of the samples to keep the numbers small and the fit simple
+        mean_time = timestamps.mean()
+        relative_times = timestamps - mean_time
+        mean_values = values.mean(axis=0)
+        slopes = relative_times @ (values - mean_values) / (relative_times @ relative_times)
+        time = min(time, timestamps[-1] + max_extrapolation)
+        return mean_values + slopes * (time - mean_time)
+
+
+# records the values of all numeric capabilities of a sensor, e.g. {'x': 0.1, 'y': 9.7, 'z': 0.4} or 1 for buttons
+# values that aren't numbers are ignored
+class SensorHistory:
+    # number of samples per capability (about 2.5 seconds at 100 Hz)
+    CAPACITY = 256
+
+    def __init__(self, sensor, capacity=CAPACITY):
+        self.capacity = capacity
+        # for every capability a ring buffer and the names of its fields (None for single values)
+        self._buffers = {}
+        self._fields = {}
+        # the receive thread appends while the game loop reads
+        self._lock = Lock()
+        sensor.register_snapshot_listener(self._on_snapshot)
+
+    def _on_snapshot(self, snapshot, keys):
+        with self._lock:
+            for key in keys:
+                # the time the value was received, not when it was published (e.g. after the batch it came with was
+                # parsed), so the filter and the extrapolation work with the actual age of the value
+                self._append(key, snapshot.receive_timestamp, snapshot.values[key])
+
+    def _append(self, key, timestamp, value):
+        if key not in self._buffers:
+            fields = tuple(value) if isinstance(value, dict) else None
+            if not self._is_numeric(value, fields):
+                return
+            self._fields[key] = fields
+            self._buffers[key] = SampleRingBuffer(self.capacity, len(fields) if fields else 1)
+
+        fields = self._fields[key]
+        if not self._is_numeric(value, fields):
+            return
+        self._buffers[key].append(timestamp, [value[field] for field in fields] if fields else value)
+
+    @staticmethod
+    def _is_numeric(value, fields):
+        if fields is None:
+            return isinstance(value, (int, float))
+        return isinstance(value, dict) and all(isinstance(value.get(field), (int, float)) for field in fields)
+
+    def has_history(self, key):
+        return key in self._buffers and len(self._buffers[key]) > 0
+
+    # returns the names of the fields of the capability in the order of the value columns (None for single values)
+    def get_fields(self, key):
+        return self._fields.get(key)
+
+    # returns copies of the timestamps (n,) and values (n, num_fields) of the latest samples of the capability, use
+    # the ring buffer directly for views
+    def get_window(self, key, num_samples=None):
+        with self._lock:
+            if key not in self._buffers:
+                return np.zeros(0), np.zeros((0, 1))
+            timestamps, values = self._buffers[key].get_window(num_samples)
+            return timestamps.copy(), values.copy()
+
+    def get_buffer(self, key):
+        return self._buffers.get(key)
+
+    # returns the values of the capability at the given times, see SampleRingBuffer.resample()
+    def resample(self, key, times):
+        with self._lock:
+            if key not in self._buffers:
+                return None
+            return self._buffers[key].resample(times)
+
+    # returns the smoothed value of one field of the capability (e.g. 'x' of 'gravity') at the given time (default:
+    # now), see SampleRingBuffer.get_filtered(); None if no values were recorded yet
+    # window_duration: the samples of the last window_duration seconds are used
+    # max_extrapolation: the value is extrapolated at most that many seconds beyond the last sample
+    def get_filtered(self, key, field=None, time=None, window_duration=0.1, max_extrapolation=0.05):
+        time = perf_counter() if time is None else time
+        with self._lock:
+            if key not in self._buffers:
+                return None
+            filtered_values = self._buffers[key].get_filtered(time, window_duration, max_extrapolation)
+        if filtered_values is None:
+            return None
+        fields = self._fields[key]
+        return float(filtered_values[fields.index(field) if fields else 0])
@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+
+"""
+Records the raw packets of a DIPPID device with their arrival times and replays them later, so the sensor handling can
+be tested without a device and with packet rates far above the ones of real devices:
+    python3 dippid_replay.py record -p 5700 -o tilt.dipr            (ctrl+c to stop)
+    python3 dippid_replay.py replay -i tilt.dipr -p 5700 --speed 4  (e.g. while the game is running)
+    python3 dippid_replay.py load-test -i tilt.dipr --speed 20      (replays to a SensorUDP and prints its stats)
+    python3 dippid_replay.py feed -i tilt.dipr                      (feeds a Sensor directly, without a socket)
+
+File format (little-endian): the magic bytes b'DIPR', a version byte and then one record per packet with the time since
+the start of the recording in seconds (float64), the length of the packet (uint16) and the packet itself. Recordings
+whose file name ends with .gz are compressed.
+"""
+
+import argparse
+import gzip
+import socket
+import struct
+import sys
+import time
+from DIPPID import Sensor, SensorUDP
+
+RECORDING_MAGIC = b'DIPR'
+RECORDING_VERSION = 1
+RECORD_HEADER = struct.Struct('<dH')
+
+
+def open_recording(file_path, mode):
+    return gzip.open(file_path, mode) if file_path.endswith('.gz') else open(file_path, mode)
+
+
+class PacketRecorder:
+    """
+    Writes packets with their arrival times to a recording file.
+    """
+
+    def __init__(self, file_path):
+        self._file = open_recording(file_path, 'wb')
+        self._file.write(RECORDING_MAGIC + bytes([RECORDING_VERSION]))
+        self._start_time = None
+        self.num_packets = 0
+
+    def add_packet(self, data, receive_timestamp=None):
+        receive_timestamp = time.perf_counter() if receive_timestamp is None else receive_timestamp
+        if self._start_time is None:
+            self._start_time = receive_timestamp
+        self._file.write(RECORD_HEADER.pack(receive_timestamp - self._start_time, len(data)) + data)
+        self.num_packets += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_recording(file_path):
+    """
+    Yields the (time since the start of the recording, packet) tuples of a recording.
+    """
+    with open_recording(file_path, 'rb') as recording_file:
+        header = recording_file.read(len(RECORDING_MAGIC) + 1)
+        if header[:len(RECORDING_MAGIC)] != RECORDING_MAGIC or header[-1] != RECORDING_VERSION:
+            raise ValueError(f"{file_path} is not a DIPPID recording")
+        while True:
+            record_header = recording_file.read(RECORD_HEADER.size)
+            if len(record_header) < RECORD_HEADER.size:
+                # end of the recording (or a recording that was cut off)
+                return
+            timestamp, length = RECORD_HEADER.unpack(record_header)
+            data = recording_file.read(length)
+            if len(data) < length:
+                return
+            yield timestamp, data
+
+
+def record(file_path, port, ip='0.0.0.0', duration=None):
+    """
+    Records all packets that arrive at the port until ctrl+c is pressed or the duration (in seconds) has passed.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((ip, port))
+    # check the duration every now and then, even if nothing arrives
+    sock.settimeout(0.5)
+    recorder = PacketRecorder(file_path)
+    start_time = time.perf_counter()
+    try:
+        while duration is None or time.perf_counter() - start_time < duration:
+            try:
+                data, addr = sock.recvfrom(SensorUDP.PACKET_BUFFER_SIZE)
+            except socket.timeout:
+                continue
+            recorder.add_packet(data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        sock.close()
+    return recorder.num_packets
+
+
+def _wait_until(target_time):
+    # sleep for most of the time and wait actively for the rest, as sleep() is too coarse for high packet rates
+    remaining_time = target_time - time.perf_counter()
+    if remaining_time > 0.002:
+        time.sleep(remaining_time - 0.001)
+    while time.perf_counter() < target_time:
+        pass
+
+
+def replay(packets, send, speed=1.0):
+    """
+    Calls send(packet) for every (timestamp, packet) tuple at the time of the recording, divided by speed; with a speed
+    of 0 the packets are sent as fast as possible. Returns the number of packets.
+    """
+    start_time = time.perf_counter()
+    num_packets = 0
+    for timestamp, data in packets:
+        if speed > 0:
+            _wait_until(start_time + timestamp / speed)
+        send(data)
+        num_packets += 1
+    return num_packets
+
+
+def replay_udp(file_path, port, ip='127.0.0.1', speed=1.0, repeat=1):
+    """
+    Sends the packets of the recording to a UDP port, as the recorded device would have.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    num_packets = 0
+    try:
+        for _ in range(repeat):
+            num_packets += replay(read_recording(file_path), lambda data: sock.sendto(data, (ip, port)), speed)
+    finally:
+        sock.close()
+    return num_packets
+
+
+def replay_into_sensor(file_path, sensor, speed=0.0, repeat=1):
+    """
+    Feeds the packets of the recording directly into a sensor (e.g. a plain Sensor() without a connection), by
+    default as fast as possible.
+    """
+    packets = list(read_recording(file_path))
+    num_packets = 0
+    for _ in range(repeat):
+        num_packets += replay(packets, sensor.feed_packet, speed)
+    return num_packets
+
+
+def main():
+    if args.command == "record":
+        print(f"[INFO]: Recording packets on port {args.port} to {args.output} (ctrl+c to stop)")
+        num_packets = record(args.output, args.port, duration=args.duration)
+        print(f"[INFO]: Recorded {num_packets} packets")
+
+    elif args.command == "replay":
+        print(f"[INFO]: Replaying {args.input} to {args.ip}:{args.port} at {args.speed}x speed")
+        try:
+            num_packets = replay_udp(args.input, args.port, args.ip, args.speed, args.repeat)
+        except KeyboardInterrupt:
+            return
+        print(f"[INFO]: Sent {num_packets} packets")
+
+    elif args.command == "load-test":
+        sensor = SensorUDP(args.port, ip='127.0.0.1')
+        start_time = time.perf_counter()
+        try:
+            num_packets = replay_udp(args.input, args.port, '127.0.0.1', args.speed, args.repeat)
+            duration = time.perf_counter() - start_time
+            # give the receive thread a moment for the last packets
+            time.sleep(0.1)
+        except KeyboardInterrupt:
+            return
+        finally:
+            # doesn't block, the receive thread wakes up at least every SensorUDP.RECEIVE_TIMEOUT seconds
+            sensor.disconnect()
+        print(f"[INFO]: Sent {num_packets} packets in {duration:.2f} s ({num_packets / duration:.0f} packets/s)")
+        print(f"[INFO]: Sensor stats: {sensor.get_receive_stats()}")
+
+    elif args.command == "feed":
+        sensor = Sensor()
+        start_time = time.perf_counter()
+        num_packets = replay_into_sensor(args.input, sensor, args.speed, args.repeat)
+        duration = time.perf_counter() - start_time
+        print(f"[INFO]: Fed {num_packets} packets in {duration:.2f} s ({num_packets / duration:.0f} packets/s)")
+        print(f"[INFO]: Last values: {dict(sensor.get_snapshot().values)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Records and replays the packets of a DIPPID device.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Records the packets that arrive at a UDP port")
+    record_parser.add_argument("-p", "--port", help="The port on which the DIPPID device sends the data", type=int,
+                               default=5700)
+    record_parser.add_argument("-o", "--output", help="The recording file (compressed if it ends with .gz)",
+                               required=True)
+    record_parser.add_argument("--duration", help="Stop after this many seconds", type=float, default=None)
+
+    for command, help_text in [("replay", "Sends a recording to a UDP port"),
+                               ("load-test", "Sends a recording to a SensorUDP on a local port and prints its stats"),
+                               ("feed", "Feeds a recording directly into a Sensor without a socket")]:
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument("-i", "--input", help="The recording file", required=True)
+        command_parser.add_argument("-s", "--speed", help="Replay speed, e.g. 2 for twice as fast; 0 sends the "
+                                                          "packets as fast as possible", type=float,
+                                    default=0.0 if command == "feed" else 1.0)
+        command_parser.add_argument("--repeat", help="Number of times the recording is replayed", type=int,
+                                    default=1)
+        if command != "feed":
+            command_parser.add_argument("-p", "--port", help="The port to which the packets are sent", type=int,
+                                        default=5700)
+        if command == "replay":
+            command_parser.add_argument("--ip", help="The IP address to which the packets are sent",
+                                        default="127.0.0.1")
+    args = parser.parse_args()
+
+    if args.command != "record" and args.speed < 0:
+        sys.stderr.write("The speed must not be negative!\n")
+        sys.exit(1)
+    main()
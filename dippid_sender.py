@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+
+"""
+Simulates a DIPPID device for testing without a smartphone or M5Stack: sends tilt and button data to a local UDP port,
+either as JSON (like the real devices) or in the compact binary format of DIPPID.py.
+"""
+
+import argparse
+import json
+import math
+import socket
+import time
+from DIPPID import encode_binary_packet
+
+
+def create_sample(t, device):
+    # tilts the device slowly back and forth and presses the button every few seconds
+    tilt = math.sin(t * 0.5)
+    button_state = int(t % 4 < 0.2)
+    if device == "smartphone":
+        return {"accelerometer": {"x": tilt, "y": 9.81 * math.cos(tilt), "z": 0.0},
+                "gravity": {"x": 9.81 * tilt, "y": 9.81 * math.cos(tilt), "z": 0.0},
+                "button_1": button_state}
+    return {"accelerometer": {"x": tilt, "y": math.cos(tilt), "z": 0.0},
+            "rotation": {"pitch": 90 * tilt, "roll": 0.0, "yaw": 0.0},
+            "button_1": button_state}
+
+
+def main():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    interval = 1 / args.rate
+    start_time = time.perf_counter()
+    num_packets = 0
+    print(f"[INFO]: Sending {args.format} packets to {args.ip}:{args.port} at {args.rate} Hz (ctrl+c to stop)")
+    try:
+        while args.duration is None or time.perf_counter() - start_time < args.duration:
+            sample = create_sample(time.perf_counter() - start_time, args.device)
+            if args.device_id is not None:
+                sample["device_id"] = args.device_id
+            if args.format == "binary":
+                packet = encode_binary_packet(sample)
+            else:
+                packet = json.dumps(sample).encode()
+            sock.sendto(packet, (args.ip, args.port))
+            num_packets += 1
+
+            # sleep until the next packet is due so the rate doesn't drift
+            next_send_time = start_time + num_packets * interval
+            time.sleep(max(next_send_time - time.perf_counter(), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+    print(f"[INFO]: Sent {num_packets} packets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sends simulated DIPPID sensor data via UDP.")
+    parser.add_argument("-p", "--port", help="The port to which the data is sent", type=int, default=5700)
+    parser.add_argument("--ip", help="The IP address to which the data is sent", default="127.0.0.1")
+    parser.add_argument("-f", "--format", help="The packet format", choices=["json", "binary"], default="json")
+    parser.add_argument("-r", "--rate", help="Packets per second", type=float, default=100)
+    parser.add_argument("--device", help="The simulated device type", choices=["smartphone", "m5stack"],
+                        default="smartphone")
+    parser.add_argument("--device-id", help="Adds a device id to the packets (0-255), see SensorHub in DIPPID.py",
+                        type=int, default=None)
+    parser.add_argument("--duration", help="Stop after this many seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    main()
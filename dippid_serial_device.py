@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+# -*- coding:utf-8 -*-
+
+"""
+Simulates a DIPPID device that is connected via USB: creates a pseudo terminal and writes JSON lines to it like an
+M5Stack does, so SensorSerial can be tested without hardware (Linux and macOS only):
+    python3 dippid_serial_device.py --link /tmp/dippid-tty
+    sensor = SensorSerial('/tmp/dippid-tty')
+
+With --reconnect-every the device is "unplugged" regularly and comes back as a new pseudo terminal behind the same
+link, to test the reconnection of SensorSerial.
+"""
+
+import argparse
+import json
+import os
+import pty
+import time
+import tty
+from dippid_sender import create_sample
+
+
+def open_device(link_path):
+    master_fd, slave_fd = pty.openpty()
+    # no echo and no line editing, like a real serial device
+    tty.setraw(slave_fd)
+    slave_path = os.ttyname(slave_fd)
+    # writing must not block when nobody reads from the device
+    os.set_blocking(master_fd, False)
+    if link_path:
+        temporary_link_path = link_path + ".new"
+        os.symlink(slave_path, temporary_link_path)
+        # replace an existing link atomically
+        os.replace(temporary_link_path, link_path)
+    print(f"[INFO]: Simulated device at {link_path or slave_path}")
+    return master_fd, slave_fd
+
+
+def main():
+    master_fd, slave_fd = open_device(args.link)
+    interval = args.lines_per_write / args.rate
+    start_time = time.perf_counter()
+    last_connect_time = start_time
+    num_lines = 0
+    try:
+        while args.duration is None or time.perf_counter() - start_time < args.duration:
+            if args.reconnect_every and time.perf_counter() - last_connect_time > args.reconnect_every:
+                print("[INFO]: Reconnecting")
+                os.close(master_fd)
+                os.close(slave_fd)
+                time.sleep(args.reconnect_pause)
+                master_fd, slave_fd = open_device(args.link)
+                last_connect_time = time.perf_counter()
+
+            # several lines can be written at once to simulate bursts
+            lines = []
+            for _ in range(args.lines_per_write):
+                lines.append(json.dumps(create_sample(time.perf_counter() - start_time, "m5stack")) + "\n")
+            try:
+                os.write(master_fd, "".join(lines).encode())
+            except OSError:
+                # the output buffer of the pseudo terminal is full as nobody reads from it
+                pass
+            num_lines += len(lines)
+
+            next_write_time = start_time + num_lines / args.lines_per_write * interval
+            time.sleep(max(next_write_time - time.perf_counter(), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(master_fd)
+        os.close(slave_fd)
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+    print(f"[INFO]: Wrote {num_lines} lines")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates a DIPPID device connected via USB with a pseudo terminal.")
+    parser.add_argument("--link", help="Creates a symlink to the pseudo terminal at this path, which stays the same "
+                                       "across reconnects", default=None)
+    parser.add_argument("-r", "--rate", help="Lines per second", type=float, default=100)
+    parser.add_argument("--lines-per-write", help="Number of lines that are written at once", type=int, default=1)
+    parser.add_argument("--reconnect-every", help="Simulate a reconnect every this many seconds", type=float,
+                        default=None)
+    parser.add_argument("--reconnect-pause", help="Seconds the device is gone when it reconnects", type=float,
+                        default=1.0)
+    parser.add_argument("--duration", help="Stop after this many seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    main()
@@ -14,3 +14,5 @@ BORDER_HEIGHT = 50
 OBSTACLE_PART_HEIGHT = 145  # preferably a factor of SCREENHEIGHT-2*BORDERHEIGHT
 MAX_HOLES_IN_OBSTACLE = 2
 M5_STACK_ROTATION_DIVIDER = 18
+SENSOR_FILTER_WINDOW = 0.1  # the tilt is smoothed over the sensor values of the last 0.1 seconds
+SENSOR_MAX_EXTRAPOLATION = 0.05  # and extrapolated at most 0.05 seconds beyond the last sensor value
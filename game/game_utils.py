@@ -27,4 +27,5 @@ def check_gate_collision(player, gate):
 
 def draw_gesture(surface, points):
     # pygame.draw.aalines(surface, (255, 0, 0), closed=False, points=points, blend=1)  # anti-aliased lines
-    pygame.draw.lines(surface, (255, 0, 0), closed=False, points=points, width=3)
+    # returns the area that was drawn on
+    return pygame.draw.lines(surface, (255, 0, 0), closed=False, points=points, width=3)
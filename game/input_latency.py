@@ -0,0 +1,160 @@
+import json
+import sys
+from time import perf_counter
+import numpy as np
+import pygame
+from dippid_history import SensorHistory
+from game.game_settings import SENSOR_FILTER_WINDOW, SENSOR_MAX_EXTRAPOLATION
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in milliseconds with fixed bins, so recording a value is O(1) and needs no allocations.
+    """
+
+    def __init__(self, bin_width_ms=0.5, max_ms=250.0):
+        self.bin_width_ms = bin_width_ms
+        # the last bin collects all latencies above max_ms
+        self.counts = np.zeros(int(max_ms / bin_width_ms) + 1, dtype=np.int64)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_value_ms = 0.0
+
+    def add(self, latency_ms):
+        self.counts[min(max(int(latency_ms / self.bin_width_ms), 0), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_value_ms = max(self.max_value_ms, latency_ms)
+
+    def get_percentile(self, percentile):
+        # the upper edge of the bin that contains the percentile (but not more than the largest latency)
+        if self.count == 0:
+            return 0.0
+        bin_index = np.searchsorted(np.cumsum(self.counts), percentile / 100 * self.count)
+        return min(float((bin_index + 1) * self.bin_width_ms), self.max_value_ms)
+
+    def get_mean(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+    def get_summary(self):
+        return {"count": self.count, "mean_ms": self.get_mean(), "p50_ms": self.get_percentile(50),
+                "p95_ms": self.get_percentile(95), "p99_ms": self.get_percentile(99), "max_ms": self.max_value_ms}
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_value_ms = 0.0
+
+
+class InputLatencyTracker:
+    """
+    Measures how old the sensor values are that the game applies, from the arrival of the packet ("receive", see
+    SensorSnapshot.receive_timestamp) to the frame that uses the value ("consume") and to the moment this frame is shown
+    ("render", right after pygame.display.flip()).
+    """
+
+    STAGES = ("receive_to_consume", "consume_to_render", "receive_to_render")
+
+    def __init__(self, stats_file_path="input_latency_stats.json"):
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.stats_file_path = stats_file_path
+        # the stats are drawn on every frame while this is set (toggled with F3 in debug mode)
+        self.show_overlay = False
+        self._consumed_snapshot = None
+        self._consume_timestamp = None
+        self._font = None
+
+    def on_consume(self, sensor_snapshot):
+        # the snapshot of the frame is only recorded if it contains values
+        if sensor_snapshot.sequence == 0:
+            return
+        self._consumed_snapshot = sensor_snapshot
+        self._consume_timestamp = perf_counter()
+        self.histograms["receive_to_consume"].add(
+            (self._consume_timestamp - sensor_snapshot.receive_timestamp) * 1000)
+
+    def on_render(self):
+        if self._consumed_snapshot is None:
+            return
+        render_timestamp = perf_counter()
+        self.histograms["consume_to_render"].add((render_timestamp - self._consume_timestamp) * 1000)
+        self.histograms["receive_to_render"].add((render_timestamp - self._consumed_snapshot.receive_timestamp) * 1000)
+        self._consumed_snapshot = None
+
+    def get_summary(self):
+        return {stage: histogram.get_summary() for stage, histogram in self.histograms.items()}
+
+    def dump_stats(self, file_path=None):
+        file_path = self.stats_file_path if file_path is None else file_path
+        stats = {stage: dict(histogram.get_summary(), bin_width_ms=histogram.bin_width_ms,
+                             counts=histogram.counts.tolist()) for stage, histogram in self.histograms.items()}
+        try:
+            with open(file_path, mode="w") as stats_file:
+                json.dump(stats, stats_file, indent=2)
+            print(f"[INFO]: Input latency stats saved to {file_path}")
+        except OSError as e:
+            sys.stderr.write(f"Couldn't save the input latency stats: {e}\n")
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def draw_overlay(self, surface, position=(10, 40), max_bar_ms=100):
+        """
+        Draws the percentiles of every stage and a small histogram of the packet-to-photon latency. Returns the area
+        that was drawn on.
+        """
+        if self._font is None:
+            self._font = pygame.font.Font(None, 20)
+        x, y = position
+        drawn_rects = []
+        for stage, histogram in self.histograms.items():
+            summary = histogram.get_summary()
+            text = f"{stage}: p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, " \
+                   f"max {summary['max_ms']:.1f} ms"
+            drawn_rects.append(surface.blit(self._font.render(text, True, (255, 255, 255)), (x, y)))
+            y += 16
+
+        # one bar per millisecond up to max_bar_ms
+        histogram = self.histograms["receive_to_render"]
+        bins_per_bar = max(int(1 / histogram.bin_width_ms), 1)
+        num_bars = int(max_bar_ms / (bins_per_bar * histogram.bin_width_ms))
+        bar_counts = histogram.counts[:num_bars * bins_per_bar].reshape(num_bars, bins_per_bar).sum(axis=1)
+        if histogram.count == 0 or bar_counts.max() == 0:
+            return drawn_rects[0].unionall(drawn_rects[1:])
+        bar_heights = bar_counts / bar_counts.max() * 40
+        y += 45
+        for i, bar_height in enumerate(bar_heights):
+            if bar_height > 0:
+                drawn_rects.append(pygame.draw.line(surface, (255, 255, 0), (x + 2 * i, y), (x + 2 * i, y - bar_height),
+                                                    2))
+        return drawn_rects[0].unionall(drawn_rects[1:])
+
+
+class SensorInput:
+    """
+    The sensor values the game loop applies: one snapshot of the sensor per frame, whose age is measured by the
+    InputLatencyTracker, and the tilt values of it, which are smoothed and slightly extrapolated over the recorded values
+    of the sensor unless the filter is turned off (then the raw value of the latest packet is used as in the original
+    game).
+    """
+
+    def __init__(self, sensor, latency_tracker, use_filter=True):
+        self.sensor = sensor
+        self.latency_tracker = latency_tracker
+        self.sensor_history = SensorHistory(sensor) if use_filter else None
+
+    def get_snapshot(self):
+        # all values of a frame are read from one snapshot, so they belong to the same packet even if a new one arrives
+        sensor_snapshot = self.sensor.get_snapshot()
+        self.latency_tracker.on_consume(sensor_snapshot)
+        return sensor_snapshot
+
+    def get_value(self, sensor_snapshot, key, field):
+        # the raw value is used as long as no values were recorded
+        if self.sensor_history is None:
+            return sensor_snapshot.get_value(key)[field]
+        filtered_value = self.sensor_history.get_filtered(key, field, window_duration=SENSOR_FILTER_WINDOW,
+                                                          max_extrapolation=SENSOR_MAX_EXTRAPOLATION)
+        return sensor_snapshot.get_value(key)[field] if filtered_value is None else filtered_value
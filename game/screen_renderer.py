@@ -0,0 +1,101 @@
+from time import perf_counter
+import pygame
+from game.input_latency import LatencyHistogram
+
+
+class ScreenRenderer:
+    """
+    Puts the drawn frames on the display in one of two modes:
+    - "flip": everything is redrawn and the whole display is flipped every frame (the original rendering)
+    - "dirty": only the areas that were drawn in this or the last frame are updated on the display; before drawing a
+      new frame, the areas of the last frame are restored from a static background. As a scrolling background would
+      change every pixel in every frame, the background doesn't scroll in this mode.
+    All drawing of the game loop has to go through blit(), draw_group() or mark_dirty(), so the changed areas are known.
+    Every frame starts with begin_frame() and ends with update_display(), which measures the frame time and the render
+    stage of the input latency (and draws its overlay if it is shown).
+    """
+
+    MODES = ("flip", "dirty")
+
+    def __init__(self, screen, mode="flip", latency_tracker=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown render mode '{mode}'! Available: {self.MODES}")
+        self.screen = screen
+        self.mode = mode
+        self.uses_dirty_rects = mode == "dirty"
+        self._background = None
+        # the areas that were drawn in the last and in the current frame; both lists are reused for all frames
+        self._previous_rects = []
+        self._current_rects = []
+        self.latency_tracker = latency_tracker
+        # the time of a frame without waiting for the next one
+        self.frame_time_histogram = LatencyHistogram(bin_width_ms=0.1, max_ms=100.0)
+        self._frame_start_time = None
+
+    def set_background(self, background):
+        """
+        Sets the static background (a surface with the size of the screen) for the dirty mode and draws it.
+        """
+        self._background = background
+        self.screen.blit(background, (0, 0))
+        self._previous_rects.clear()
+        self._current_rects.clear()
+        pygame.display.flip()
+
+    def reset_stats(self):
+        self.frame_time_histogram.reset()
+        self._frame_start_time = None
+        if self.latency_tracker is not None:
+            self.latency_tracker.reset()
+
+    def begin_frame(self):
+        self._frame_start_time = perf_counter()
+        # erase everything that was drawn in the last frame
+        if self.uses_dirty_rects:
+            for rect in self._previous_rects:
+                self.screen.blit(self._background, rect, area=rect)
+
+    def mark_dirty(self, rect):
+        if self.uses_dirty_rects and rect is not None and rect.width > 0 and rect.height > 0:
+            self._current_rects.append(rect)
+
+    def blit(self, surface, position, area=None):
+        rect = self.screen.blit(surface, position, area=area)
+        self.mark_dirty(rect)
+        return rect
+
+    def draw_group(self, sprite_group):
+        if not self.uses_dirty_rects:
+            sprite_group.draw(self.screen)
+            return
+        for sprite in sprite_group.sprites():
+            self.blit(sprite.image, sprite.rect)
+
+    def update_display(self):
+        if self.latency_tracker is not None and self.latency_tracker.show_overlay:
+            self.mark_dirty(self.latency_tracker.draw_overlay(self.screen))
+
+        if not self.uses_dirty_rects:
+            pygame.display.flip()
+        else:
+            # the areas of the last frame have to be updated as well, as they were erased
+            self._previous_rects.extend(self._current_rects)
+            pygame.display.update(self._previous_rects)
+            self._previous_rects, self._current_rects = self._current_rects, self._previous_rects
+            self._current_rects.clear()
+
+        if self.latency_tracker is not None:
+            self.latency_tracker.on_render()
+        if self._frame_start_time is not None:
+            self.frame_time_histogram.add((perf_counter() - self._frame_start_time) * 1000)
+            self._frame_start_time = None
+
+    def report_stats(self):
+        """
+        Prints the frame times of the last game (to compare both modes) and saves its input latency stats.
+        """
+        if self.latency_tracker is not None:
+            self.latency_tracker.dump_stats()
+        frame_times = self.frame_time_histogram.get_summary()
+        print(f"[INFO]: Frame times in {self.mode} mode: mean {frame_times['mean_ms']:.2f} ms, "
+              f"p95 {frame_times['p95_ms']:.2f} ms, max {frame_times['max_ms']:.2f} ms ({frame_times['count']} frames)")
@@ -1,15 +1,18 @@
 import os
 import sys
 import numpy as np
-from DIPPID import SensorUDP
+from DIPPID import SensorUDP, PygameEventDispatcher
+from dippid_asyncio import SensorEventLoop, SensorUDPAsync
 from game.assets_loader import SoundHandler, ImageHandler
 from game.game_settings import GAME_TITLE, SCREEN_WIDTH, SCREEN_HEIGHT, FPS, BACKGROUND_MUSIC, \
     BACKGROUND_MOVEMENT_SPEED, BORDER_HEIGHT, M5_STACK_ROTATION_DIVIDER
 from game.game_utils import draw_gesture
 from game.gate_type import GateType
+from game.input_latency import InputLatencyTracker, SensorInput
 from game.obstacle import Obstacle, SharedObstacleState
-# from gesture_recognizer.dollar_one_recognizer import DollarOneRecognizer
-from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer
+from game.screen_renderer import ScreenRenderer
+from gesture_recognizer import recognizer_registry
+from gesture_recognizer.async_recognizer import AsyncGestureRecognizer
 from game.player_character import PlayerCharacter
 import pygame
 import pygame_menu
@@ -28,17 +31,41 @@ from pygame.locals import (
 # noinspection PyAttributeOutsideInit
 class SuperDippidBoy:
 
-    def __init__(self, debug_active: bool, dippid_port=5700):
+    def __init__(self, debug_active: bool, dippid_port=5700, recognition_worker="thread",
+                 recognizer_backend="dollar_p", sensor_transport="thread", render_mode="flip", sensor_filter=True):
         self.debug = debug_active
 
         self.highscore_file_path = os.path.join("assets", "highscore.txt")
         self.load_highscore()
 
         # init dippid
-        self.dippid_sensor = SensorUDP(dippid_port)
+        if sensor_transport == "asyncio":
+            # the sensor is served by an asyncio event loop, which (unlike the receive thread of SensorUDP) can be
+            # stopped at any time, even if the device doesn't send anything anymore
+            self.sensor_event_loop = SensorEventLoop()
+            self.dippid_sensor = self.sensor_event_loop.add_sensor(SensorUDPAsync(dippid_port))
+        else:
+            self.sensor_event_loop = None
+            self.dippid_sensor = SensorUDP(dippid_port)
+        # the callback is run on the game loop instead of the receive thread, as it changes the state of the game;
+        # button_1 isn't coalesced and the sensor doesn't merge the button changes of a batch, so every press and
+        # release counts; the dispatcher is created only once, so no events of an old one can be left over
+        self.SENSOR_CALLBACK_EVENT = pygame.USEREVENT + 5
+        self.sensor_callback_dispatcher = PygameEventDispatcher(self.SENSOR_CALLBACK_EVENT)
+        self.dippid_sensor.set_callback_dispatcher(self.sensor_callback_dispatcher)
+        self.dippid_sensor.register_callback('button_1', self.handle_button_press)
+        # measures how old the sensor values are when they are shown; in debug mode the stats are shown with F3 and
+        # saved after every game
+        self.input_latency_tracker = InputLatencyTracker()
+        self.sensor_input = SensorInput(self.dippid_sensor, self.input_latency_tracker, use_filter=sensor_filter)
+        # "flip" redraws and shows the whole screen every frame, "dirty" only the areas that changed (see
+        # ScreenRenderer); in debug mode the frame times are printed after every game to compare both modes
+        self.render_mode = render_mode
 
         # init gesture recognizer
-        self.gesture_recognizer = DollarPRecognizer()
+        self.gesture_recognizer = recognizer_registry.create_recognizer(recognizer_backend)
+        # gestures drawn while playing are recognized in the background so the game loop isn't blocked
+        self.async_gesture_recognizer = AsyncGestureRecognizer(self.gesture_recognizer, worker_type=recognition_worker)
 
         # setup the pygame window
         self.setup_game_window()
@@ -59,6 +86,7 @@ class SuperDippidBoy:
         self.background_width, self.background_height = self.background.get_size()
         # cut off 10 pixels at the top of the background so it looks a bit better
         self.background_area = (0, 10, self.background_width, self.background_height)
+        self.screen_renderer = ScreenRenderer(self.screen, self.render_mode, self.input_latency_tracker)
 
     def draw_background(self):
         # Display the background
@@ -305,6 +333,8 @@ class SuperDippidBoy:
 
         # save gesture to file and show status label whether it worked or not
         status = self.gesture_recognizer.save_gesture(self.new_gesture_name, self.new_gesture)
+        if status:
+            self.async_gesture_recognizer.reload_templates()
         self.toggle_save_gesture_status(True) if status else self.toggle_save_gesture_status(False)
 
     def toggle_save_gesture_status(self, success: bool):
@@ -344,13 +374,19 @@ class SuperDippidBoy:
         # Clock object used to help control the game's framerate. Used in the main loop to make sure the game doesn't
         # run too fast
         self.clock = pygame.time.Clock()
+        self.screen_renderer.reset_stats()
+        # the score text is only rendered again when the score changes
+        self.score_surface = None
+        self.score_surface_points = None
 
         self.gesture_button_pressed = False
         self.left_mouse_pressed = False
         self.current_stroke_index = 0
-        self.dippid_sensor.register_callback('button_1', self.handle_button_press)
 
         self.create_custom_events()
+        # the menu's event loop has taken the sensor events since the last game, the button presses in the menu don't
+        # count
+        self.sensor_callback_dispatcher.discard_pending_jobs()
         self.run_game_loop()
 
     def create_custom_events(self):
@@ -367,11 +403,17 @@ class SuperDippidBoy:
         self.UPDATE_SCORE_EVENT = pygame.USEREVENT + 3
         pygame.time.set_timer(self.UPDATE_SCORE_EVENT, 1000)  # update score each second
 
+        # sent when the background gesture recognition has finished
+        self.GESTURE_RECOGNIZED_EVENT = pygame.USEREVENT + 4
+
     def run_game_loop(self):
         """
         Main game loop
         """
-        self.draw_background()
+        if self.screen_renderer.uses_dirty_rects:
+            self.screen_renderer.set_background(self.create_static_background())
+        else:
+            self.draw_background()
 
         self.is_drawing = False
         self.show_gesture = False
@@ -381,6 +423,9 @@ class SuperDippidBoy:
         while self.is_running:
             # make sure the game doesn't run faster than the defined frames per second
             self.clock.tick(FPS)
+            # the time the frame takes is measured from here on, without waiting for the next one; in the dirty rect
+            # mode this also erases the objects of the last frame, the background doesn't scroll in this mode
+            self.screen_renderer.begin_frame()
 
             # if self.debug:
             #     current_fps = self.clock.get_fps()
@@ -388,20 +433,21 @@ class SuperDippidBoy:
             self.handle_events()
 
             self.check_player_movement()
-            self.move_background()
+            if not self.screen_renderer.uses_dirty_rects:
+                self.move_background()
             self.update_game_objects()
 
             # TODO show gesture on separate thread so main loop time isn't blocked by this?
             if self.show_gesture and len(self.gesture_points) > 2:  # we need at least two points to draw a line
                 points = [(p[0], p[1])for p in self.gesture_points]  # unpack only the first two values for drawing
-                draw_gesture(self.screen, points)
+                self.screen_renderer.mark_dirty(draw_gesture(self.screen, points))
 
             self.update_score()
             self.check_collisions()
 
-            # Flip the contents of pygame's software double buffer to the screen.
+            # Flip the contents of pygame's software double buffer to the screen (or only the areas that changed).
             # This makes everything we've drawn visible all at once.
-            pygame.display.flip()
+            self.screen_renderer.update_display()
 
         # clean up after the main loop finished and return to the main menu
         self.return_to_menu()
@@ -416,6 +462,8 @@ class SuperDippidBoy:
             elif event.type == KEYDOWN:
                 if event.key == K_ESCAPE:
                     self.is_running = False
+                elif self.debug and event.key == pygame.K_F3:
+                    self.input_latency_tracker.show_overlay = not self.input_latency_tracker.show_overlay
 
             elif event.type == KEYUP:
                 if self.debug and (event.key == pygame.K_w or event.key == pygame.K_s):
@@ -469,17 +517,23 @@ class SuperDippidBoy:
                 self.wall_collidables.add(*new_obstacle.walls)
                 self.gate_collidables.add(*new_obstacle.gates)
 
+            elif event.type == self.GESTURE_RECOGNIZED_EVENT:
+                # the background gesture recognition has finished
+                if event.gesture is not None:
+                    self.main_character.set_current_form(event.gesture)
+
             elif event.type == self.UPDATE_SCORE_EVENT:
                 self.current_points += 5
 
+            elif event.type == self.SENSOR_CALLBACK_EVENT:
+                self.sensor_callback_dispatcher.handle_event(event)
+
     def finish_drawing_gesture(self):
         self.left_mouse_pressed = False
         self.is_drawing = False
         self.show_gesture = False
-        predicted_gesture = self.gesture_recognizer.predict_gesture(self.gesture_points)
-        if predicted_gesture is not None:
-            print(f"Predicted gesture: {predicted_gesture}")
-            self.main_character.set_current_form(predicted_gesture)
+        # the result is applied as soon as the GESTURE_RECOGNIZED_EVENT arrives in handle_events()
+        self.async_gesture_recognizer.submit(self.gesture_points, self.on_gesture_recognized)
 
         self.gesture_points = []  # reset the gesture points
         self.current_stroke_index = 0
@@ -494,12 +548,22 @@ class SuperDippidBoy:
         else:
             print('button 1 pressed')
             self.gesture_button_pressed = True
+            # a new gesture is started, so the result of the previous one isn't needed anymore
+            self.async_gesture_recognizer.cancel_pending()
+
+    def on_gesture_recognized(self, predicted_gesture):
+        # called on a worker thread, so hand the result over to the game loop (pygame.event.post is thread-safe)
+        if predicted_gesture is not None:
+            print(f"Predicted gesture: {predicted_gesture}")
+        pygame.event.post(pygame.event.Event(self.GESTURE_RECOGNIZED_EVENT, gesture=predicted_gesture))
 
     def check_player_movement(self):
-        if "gravity" in self.dippid_sensor.get_capabilities():
+        sensor_snapshot = self.sensor_input.get_snapshot()
+        if sensor_snapshot.has_capability("gravity"):
             # dippid device is smartphone
-            self.main_character.change_movement(angle=self.dippid_sensor.get_value('gravity')[self.dippid_axis])
-        elif "rotation" in self.dippid_sensor.get_capabilities():
+            self.main_character.change_movement(
+                angle=self.sensor_input.get_value(sensor_snapshot, 'gravity', self.dippid_axis))
+        elif sensor_snapshot.has_capability("rotation"):
             # dippid device is m5stack
             if self.dippid_axis == 'x':
                 rotation_type = 'pitch'
@@ -507,7 +571,8 @@ class SuperDippidBoy:
                 rotation_type = 'roll'
             else:
                 rotation_type = 'yaw'
-            rotation_angle = self.dippid_sensor.get_value('rotation')[rotation_type] / M5_STACK_ROTATION_DIVIDER
+            rotation_angle = self.sensor_input.get_value(sensor_snapshot, 'rotation',
+                                                         rotation_type) / M5_STACK_ROTATION_DIVIDER
             self.main_character.change_movement(rotation_angle)
 
         if self.debug:
@@ -537,28 +602,42 @@ class SuperDippidBoy:
             # so reset the rect and start over
             self.background_rect.x = 0
 
-    def update_game_objects(self):
+    def create_static_background(self):
+        # the background for the dirty rect mode: the (not scrolling) background image together with the borders
+        static_background = pygame.Surface(self.screen.get_size()).convert()
+        static_background.blit(self.background, (0, 0), area=self.background_area)
+        self.draw_borders(static_background)
+        return static_background
+
+    def draw_borders(self, surface):
         # draw top and bottom border blocks
-        pygame.draw.rect(self.screen, (24, 61, 87), (0, 0, SCREEN_WIDTH, BORDER_HEIGHT))
-        pygame.draw.rect(self.screen, (74, 59, 43), (0, SCREEN_HEIGHT - BORDER_HEIGHT, SCREEN_WIDTH, BORDER_HEIGHT))
+        pygame.draw.rect(surface, (24, 61, 87), (0, 0, SCREEN_WIDTH, BORDER_HEIGHT))
+        pygame.draw.rect(surface, (74, 59, 43), (0, SCREEN_HEIGHT - BORDER_HEIGHT, SCREEN_WIDTH, BORDER_HEIGHT))
+
+    def update_game_objects(self):
+        if not self.screen_renderer.uses_dirty_rects:
+            # in the dirty rect mode the borders are part of the static background
+            self.draw_borders(self.screen)
 
         # update obstacles
         self.obstacles.update()
-        self.obstacles.draw(self.screen)
+        self.screen_renderer.draw_group(self.obstacles)
 
         # update the main character
         self.main_character.update()
-        self.screen.blit(self.main_character.image, self.main_character.rect)
+        self.screen_renderer.blit(self.main_character.image, self.main_character.rect)
 
         if self.debug:
             # show player hitbox in debug mode
             hitbox = (self.main_character.rect.x, self.main_character.rect.y, self.main_character.rect.width,
                       self.main_character.rect.height)
-            pygame.draw.rect(self.screen, (255, 0, 0), hitbox, 2)
+            self.screen_renderer.mark_dirty(pygame.draw.rect(self.screen, (255, 0, 0), hitbox, 2))
 
     def update_score(self):
-        text_surface = self.font.render(f"Score: {self.current_points}", True, (255, 0, 0))
-        self.screen.blit(text_surface, (SCREEN_WIDTH // 2 - 50, 15))  # center score at the top
+        if self.score_surface_points != self.current_points:
+            self.score_surface = self.font.render(f"Score: {self.current_points}", True, (255, 0, 0))
+            self.score_surface_points = self.current_points
+        self.screen_renderer.blit(self.score_surface, (SCREEN_WIDTH // 2 - 50, 15))  # center score at the top
 
     def check_collisions(self):
         # Check if any obstacles have collided with the player
@@ -590,6 +669,9 @@ class SuperDippidBoy:
         # stop music
         self.sound_handler.stop_sound()
         SharedObstacleState.reset_move_speed()  # reset obstacle movement speed
+        self.async_gesture_recognizer.cancel_pending()  # a gesture result is useless after the game has ended
+        if self.debug:
+            self.screen_renderer.report_stats()
 
         # show current score and highscore and wait until user wants to go on
         self.show_endscreen()
@@ -643,6 +725,9 @@ class SuperDippidBoy:
 
     def end_game(self):
         pygame.mixer.quit()
+        self.async_gesture_recognizer.shutdown()
+        if self.sensor_event_loop is not None:
+            self.sensor_event_loop.close()
 
         """
         if self.has_connection:
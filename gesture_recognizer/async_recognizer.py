@@ -0,0 +1,123 @@
+"""
+Runs the gesture recognition on a worker thread or process so the game loop doesn't have to wait for the result.
+"""
+
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+# the recognizer instance of a worker process (only used if the worker type is "process")
+_worker_recognizer = None
+
+
+def _init_worker_process(recognizer):
+    global _worker_recognizer
+    _worker_recognizer = recognizer
+
+
+def _call_in_worker_process(method_name, args):
+    return getattr(_worker_recognizer, method_name)(*args)
+
+
+class AsyncGestureRecognizer:
+    """
+    Wraps a gesture recognizer (e.g. the DollarPRecognizer) and predicts gestures on a worker pool. Only the result of
+    the most recent request is reported, every older request is cancelled or its result is dropped.
+    """
+
+    WORKER_TYPES = ("thread", "process")
+
+    def __init__(self, recognizer, worker_type="thread"):
+        if worker_type not in self.WORKER_TYPES:
+            raise ValueError(f"Unknown worker type '{worker_type}'! Available: {self.WORKER_TYPES}")
+        self.recognizer = recognizer
+        self.worker_type = worker_type
+
+        self._lock = threading.Lock()
+        self._latest_request_id = 0
+        self._pending_future: Optional[Future] = None
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        # the pool is created lazily so that nothing is started if no gesture is drawn at all
+        if self._executor is None:
+            if self.worker_type == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gesture_recognition")
+            else:
+                # the worker process gets its own copy of the recognizer (including all normalized templates);
+                # "spawn" is used as forking a process with an initialized pygame display is not safe
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_init_worker_process, initargs=(self.recognizer,))
+        return self._executor
+
+    def submit(self, input_points: list, on_result: Callable[[Optional[str]], None]) -> int:
+        """
+        Starts predicting the given gesture points in the background. The callback gets the predicted gesture name
+        (or None) and is called on a worker thread, so it should only hand the result over to the main thread,
+        e.g. by posting a pygame event. Returns the id of the new request.
+        """
+        # copy the points so the caller can reuse its list while the gesture is still being predicted
+        return self.submit_method("predict_gesture", (list(input_points),), on_result)
+
+    def submit_method(self, method_name: str, args: tuple, on_result: Callable) -> int:
+        """
+        Same as submit() for any method of the recognizer, e.g. submit_method("recognize_resampled", (points,), ...)
+        for the provisional results of the streaming recognizer. The arguments must not be changed afterwards.
+        """
+        with self._lock:
+            self._cancel_pending_future()
+            self._latest_request_id += 1
+            request_id = self._latest_request_id
+
+            if self.worker_type == "thread":
+                future = self._get_executor().submit(getattr(self.recognizer, method_name), *args)
+            else:
+                future = self._get_executor().submit(_call_in_worker_process, method_name, args)
+            self._pending_future = future
+
+        future.add_done_callback(lambda f: self._on_request_done(request_id, f, on_result))
+        return request_id
+
+    def _on_request_done(self, request_id: int, future: Future, on_result: Callable):
+        with self._lock:
+            if future.cancelled() or request_id != self._latest_request_id:
+                # a newer gesture has been started in the meantime, so this result is stale
+                return
+            self._pending_future = None
+
+        exception = future.exception()
+        if exception is not None:
+            sys.stderr.write(f"Gesture recognition failed: {exception}\n")
+            return
+        on_result(future.result())
+
+    def _cancel_pending_future(self):
+        if self._pending_future is not None:
+            # a future that is already running can't be cancelled, but its result is ignored when it arrives
+            self._pending_future.cancel()
+            self._pending_future = None
+
+    def cancel_pending(self):
+        """
+        Cancels the current request, e.g. because the player started to draw a new gesture.
+        """
+        with self._lock:
+            self._cancel_pending_future()
+            self._latest_request_id += 1
+
+    def reload_templates(self):
+        """
+        Must be called after the templates of the wrapped recognizer have changed. Worker processes only have a copy
+        of the recognizer, so they are restarted; worker threads share the recognizer and don't need to do anything.
+        """
+        if self.worker_type == "process":
+            self.shutdown()
+
+    def shutdown(self):
+        self.cancel_pending()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
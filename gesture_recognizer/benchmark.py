@@ -0,0 +1,154 @@
+"""
+Benchmark for the gesture recognizers. Generates synthetic gestures from the templates in the gesture file and measures
+the latency, throughput and accuracy of the recognizer backends from the recognizer registry.
+
+Must be started from the project root, e.g.:
+    python -m gesture_recognizer.benchmark --samples 100 --noise 5 --rotation 20 --output benchmark_results.json
+"""
+
+import argparse
+import datetime
+import json
+import pathlib
+import subprocess
+import time
+from typing import Callable, Optional
+import numpy as np
+from gesture_recognizer import recognizer_registry, resampling
+
+
+GESTURE_FILE_PATH = pathlib.Path("gesture_recognizer") / "gestures.json"
+
+
+def generate_gesture(template_points: list, rng: np.random.Generator, noise: float = 0.0,
+                     num_points: Optional[int] = None, num_strokes: int = 1, rotation: float = 0.0) -> list[tuple]:
+    """
+    Creates a synthetic variation of the given template points and returns it in the same form as the game does,
+    i.e. [(x, y, stroke_id), ...].
+
+    noise: standard deviation of the gaussian noise that is added to every point (in pixels)
+    num_points: the number of points of the generated gesture (the original number if None)
+    num_strokes: the path is split into this many strokes of (roughly) the same number of points
+    rotation: the gesture is rotated by a random angle in [-rotation, rotation] degrees around its centroid
+    """
+    points = np.asarray(template_points, dtype=float)[:, :2]
+
+    if num_points is not None and num_points != len(points):
+        # resample the path to the requested number of points (equidistant along the path)
+        points = resampling.resample(points, num_points)
+
+    if rotation:
+        angle = np.radians(rng.uniform(-rotation, rotation))
+        rotation_matrix = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        centroid = points.mean(axis=0)
+        points = (points - centroid) @ rotation_matrix.T + centroid
+
+    if noise:
+        points = points + rng.normal(0, noise, points.shape)
+
+    # split the points into strokes of (roughly) the same length
+    stroke_ids = np.arange(len(points)) * num_strokes // len(points)
+    return [(float(x), float(y), int(stroke_id)) for (x, y), stroke_id in zip(points, stroke_ids)]
+
+
+def generate_dataset(templates: dict, num_samples: int, seed: int, **generator_settings) -> list[tuple[str, list]]:
+    """
+    Returns a shuffled list of (gesture name, gesture points) with num_samples samples per gesture.
+    """
+    rng = np.random.default_rng(seed)
+    dataset = [(gesture_name, generate_gesture(gesture_data["original"], rng, **generator_settings))
+               for gesture_name, gesture_data in templates.items() for _ in range(num_samples)]
+    rng.shuffle(dataset)
+    return dataset
+
+
+def create_predictor(recognizer_name: str) -> Callable[[list], Optional[str]]:
+    recognizer = recognizer_registry.create_recognizer(recognizer_name)
+    recognition_cache = getattr(recognizer, "recognition_cache", None)
+    if recognition_cache is not None:
+        # the generated gestures of a template are often the same after quantizing them, so the cache would measure
+        # cache hits instead of the recognition
+        recognition_cache.max_size = 0
+    return lambda gesture_points: recognizer.predict(gesture_points).gesture
+
+
+def run_benchmark(predict: Callable[[list], Optional[str]], dataset: list[tuple[str, list]]) -> dict:
+    latencies = []
+    num_correct = 0
+    num_rejected = 0
+    predict(dataset[0][1])  # warm up
+    for gesture_name, gesture_points in dataset:
+        start = time.perf_counter()
+        predicted_gesture = predict(gesture_points)
+        latencies.append(time.perf_counter() - start)
+
+        if predicted_gesture is None:
+            num_rejected += 1
+        elif predicted_gesture == gesture_name:
+            num_correct += 1
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "num_calls": len(dataset),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p90": float(np.percentile(latencies_ms, 90)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "max": float(latencies_ms.max()),
+        },
+        "throughput_per_s": float(len(dataset) / latencies_ms.sum() * 1000),
+        "accuracy": num_correct / len(dataset),
+        "rejection_rate": num_rejected / len(dataset),
+    }
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gesture recognizers with synthetic gestures.")
+    parser.add_argument("--recognizers", nargs="+", choices=recognizer_registry.get_backend_names(),
+                        default=["dollar_p", "dollar_one"])
+    parser.add_argument("--samples", type=int, default=50, help="Number of generated samples per gesture")
+    parser.add_argument("--noise", type=float, default=3.0, help="Std. deviation of the noise per point in pixels")
+    parser.add_argument("--points", type=int, default=None, help="Number of points per generated gesture")
+    parser.add_argument("--strokes", type=int, default=1, help="Number of strokes per generated gesture")
+    parser.add_argument("--rotation", type=float, default=10.0, help="Max. random rotation in degrees")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    with open(GESTURE_FILE_PATH, 'r') as f:
+        templates = json.load(f)
+    generator_settings = {"noise": args.noise, "num_points": args.points, "num_strokes": args.strokes,
+                          "rotation": args.rotation}
+    dataset = generate_dataset(templates, args.samples, args.seed, **generator_settings)
+
+    results = {}
+    for recognizer_name in args.recognizers:
+        results[recognizer_name] = run_benchmark(create_predictor(recognizer_name), dataset)
+        latency = results[recognizer_name]["latency_ms"]
+        print(f"{recognizer_name:>10}: p50 {latency['p50']:.3f} ms, p90 {latency['p90']:.3f} ms, "
+              f"p99 {latency['p99']:.3f} ms, {results[recognizer_name]['throughput_per_s']:.1f} calls/s, "
+              f"accuracy {results[recognizer_name]['accuracy']:.1%}")
+
+    if args.output is not None:
+        report = {
+            "commit": get_git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "settings": {"samples_per_gesture": args.samples, "seed": args.seed, **generator_settings},
+            "results": results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Compact binary format for the gesture templates that can be memory-mapped with numpy and used without copying. The
+templates themselves are kept in the JSON gesture file, a template file is a cache derived from it for one recognizer
+(see template_store.py).
+
+A template file consists of two append-only files:
+- the sample file (e.g. "gestures.gtpl"): a header followed by fixed-size sample records. Every record contains the
+  gesture name, the position of its raw points in the raw point file and the normalized point cloud as float32 values,
+  so all normalized clouds can be mapped as one (num_samples, num_points, 2) array.
+- the raw point file (e.g. "gestures.gtpl.raw"): a header followed by the raw points of all samples as contiguous
+  (x, y, stroke_id) records.
+
+Adding a sample only appends one record to each file; the number of records is derived from the file size, so the
+header only has to be updated for the checksum of the JSON gesture file the templates were derived from. Both headers
+contain the same random write id, so a sample file is never used with a raw point file that was written for another
+one.
+
+Can also be used as a command line tool to convert from and to the JSON gesture file, e.g.:
+    python -m gesture_recognizer.binary_template_format import gesture_recognizer/gestures.json gestures.gtpl
+    python -m gesture_recognizer.binary_template_format export gestures.gtpl gestures_export.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import secrets
+import struct
+from typing import Callable, Optional
+import numpy as np
+
+
+MAGIC = b"GTPL"
+RAW_MAGIC = b"GTPR"
+VERSION = 3
+# magic, version, number of points per normalized cloud, write id, checksum of the JSON gesture file (sha1), padded to
+# 48 bytes
+HEADER_FORMAT = "<4sHI8s20s10x"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SOURCE_CHECKSUM_OFFSET = struct.calcsize("<4sHI8s")
+NO_SOURCE_CHECKSUM = bytes(20)
+MAX_NAME_LENGTH = 32  # in bytes (utf-8)
+
+RAW_POINT_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("stroke_id", "<i4")])
+NO_STROKE_ID = -1  # stored for points that don't have a stroke id
+
+
+def get_sample_dtype(num_points: int) -> np.dtype:
+    return np.dtype([
+        ("gesture_name", f"S{MAX_NAME_LENGTH}"),
+        ("raw_offset", "<i8"),  # index of the first raw point of this sample in the raw point file
+        ("raw_count", "<i4"),
+        ("points", "<f4", (num_points, 2)),
+    ])
+
+
+def get_raw_file_path(sample_file_path: pathlib.Path) -> pathlib.Path:
+    return sample_file_path.with_name(sample_file_path.name + ".raw")
+
+
+def get_temp_file_path(file_path: pathlib.Path) -> pathlib.Path:
+    return file_path.with_name(file_path.name + ".tmp")
+
+
+def calc_source_checksum(data: bytes) -> bytes:
+    return hashlib.sha1(data).digest()
+
+
+def check_gesture_name(gesture_name: str):
+    """
+    Raises a ValueError if the gesture name doesn't fit into a sample record.
+    """
+    if len(gesture_name.encode("utf-8")) > MAX_NAME_LENGTH:
+        raise ValueError(f"The gesture name '{gesture_name}' is too long (max. {MAX_NAME_LENGTH} bytes)!")
+
+
+def read_header(file_path: pathlib.Path, magic: bytes) -> tuple[int, bytes, bytes]:
+    """
+    Returns the number of points, the write id and the source checksum from the header of a sample or raw point file.
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"'{file_path}' is not a gesture template file (version {VERSION})!")
+    file_magic, version, num_points, write_id, source_checksum = struct.unpack(HEADER_FORMAT, header)
+    if file_magic != magic or version != VERSION:
+        raise ValueError(f"'{file_path}' is not a gesture template file (version {VERSION})!")
+    return num_points, write_id, source_checksum
+
+
+class BinaryTemplateFile:
+
+    def __init__(self, file_path: pathlib.Path):
+        self.file_path = pathlib.Path(file_path)
+        self.raw_file_path = get_raw_file_path(self.file_path)
+
+    def exists(self) -> bool:
+        return self.file_path.exists() and self.raw_file_path.exists()
+
+    def read_num_points(self) -> int:
+        return read_header(self.file_path, MAGIC)[0]
+
+    def read_source_checksum(self) -> bytes:
+        return read_header(self.file_path, MAGIC)[2]
+
+    def write_source_checksum(self, source_checksum: bytes):
+        with open(self.file_path, 'r+b') as f:
+            f.seek(SOURCE_CHECKSUM_OFFSET)
+            f.write(source_checksum)
+
+    def map(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-maps both files read-only and returns the sample records and the raw points. The arrays are views on
+        the files, nothing is copied; they must be mapped again after samples have been appended. Raises a ValueError
+        if the files don't belong together.
+        """
+        num_points, write_id, _ = read_header(self.file_path, MAGIC)
+        if read_header(self.raw_file_path, RAW_MAGIC)[1] != write_id:
+            raise ValueError(f"The raw point file of '{self.file_path}' belongs to another template file!")
+        return (self._map_records(self.file_path, get_sample_dtype(num_points)),
+                self._map_records(self.raw_file_path, RAW_POINT_DTYPE))
+
+    def _map_records(self, file_path: pathlib.Path, dtype: np.dtype) -> np.ndarray:
+        # a record that was only written partially (e.g. because the program crashed) is ignored
+        num_records = (file_path.stat().st_size - HEADER_SIZE) // dtype.itemsize
+        if num_records <= 0:
+            # mapping an empty region is not possible
+            return np.empty(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(num_records,))
+
+    def create(self, num_points: int, source_checksum: bytes = NO_SOURCE_CHECKSUM):
+        """
+        Creates (or truncates) both files so they only contain the header.
+        """
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        write_id = secrets.token_bytes(8)
+        with open(self.file_path, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, num_points, write_id, source_checksum))
+        with open(self.raw_file_path, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, RAW_MAGIC, VERSION, 0, write_id, NO_SOURCE_CHECKSUM))
+
+    def append_sample(self, gesture_name: str, raw_points: list, normalized_points: np.ndarray):
+        num_points = self.read_num_points()
+        check_gesture_name(gesture_name)
+        encoded_name = gesture_name.encode("utf-8")
+
+        raw_records = np.zeros(len(raw_points), dtype=RAW_POINT_DTYPE)
+        for i, point in enumerate(raw_points):
+            stroke_id = point[2] if len(point) > 2 and point[2] is not None else NO_STROKE_ID
+            raw_records[i] = (point[0], point[1], stroke_id)
+
+        # the raw points are written first: if the program stops in between, the sample record is simply missing
+        with open(self.raw_file_path, 'ab') as f:
+            raw_offset = (f.tell() - HEADER_SIZE) // RAW_POINT_DTYPE.itemsize
+            f.write(raw_records.tobytes())
+
+        sample_record = np.zeros(1, dtype=get_sample_dtype(num_points))
+        sample_record[0] = (encoded_name, raw_offset, len(raw_points), normalized_points)
+        with open(self.file_path, 'ab') as f:
+            f.write(sample_record.tobytes())
+
+    def write_all(self, samples: list[tuple[str, list, np.ndarray]], num_points: int,
+                  source_checksum: bytes = NO_SOURCE_CHECKSUM):
+        """
+        Rewrites both files with the given (gesture name, raw points, normalized points) samples. The new files are
+        written next to the old ones first and replace them afterwards. The old files must not be memory-mapped
+        anymore, replacing them fails on Windows otherwise.
+
+        The raw point file is replaced first. If the program stops before the sample file has been replaced as well,
+        recover() finishes the replacement; until then map() refuses the files as their write ids differ.
+        """
+        # checked before anything is written, so an invalid name doesn't leave half written files behind
+        for gesture_name, _, _ in samples:
+            check_gesture_name(gesture_name)
+        temp_file = BinaryTemplateFile(get_temp_file_path(self.file_path))
+        temp_file.create(num_points, source_checksum)
+        for gesture_name, raw_points, normalized_points in samples:
+            temp_file.append_sample(gesture_name, raw_points, normalized_points)
+        for file_path in (temp_file.file_path, temp_file.raw_file_path):
+            # opened for writing, as Windows can only flush files that are writable
+            with open(file_path, 'ab') as f:
+                os.fsync(f.fileno())
+        os.replace(temp_file.raw_file_path, self.raw_file_path)
+        os.replace(temp_file.file_path, self.file_path)
+
+    def recover(self):
+        """
+        Finishes a write_all() that was interrupted between replacing the raw point file and the sample file.
+        """
+        temp_file_path = get_temp_file_path(self.file_path)
+        if not temp_file_path.exists() or not self.raw_file_path.exists():
+            return
+        try:
+            temp_write_id = read_header(temp_file_path, MAGIC)[1]
+            raw_write_id = read_header(self.raw_file_path, RAW_MAGIC)[1]
+        except ValueError:
+            return
+        if temp_write_id == raw_write_id:
+            os.replace(temp_file_path, self.file_path)
+
+
+def get_raw_points(sample_record, raw_points: np.ndarray) -> list:
+    """
+    Returns the raw points of a sample in the same format as in the JSON gesture file, i.e. [[x, y], ...] or
+    [[x, y, stroke_id], ...] if the points have stroke ids.
+    """
+    start = sample_record["raw_offset"]
+    points = raw_points[start:start + sample_record["raw_count"]]
+    if np.all(points["stroke_id"] == NO_STROKE_ID):
+        return [[float(x), float(y)] for x, y in zip(points["x"], points["y"])]
+    return [[float(x), float(y), int(stroke_id)] for x, y, stroke_id in zip(points["x"], points["y"],
+                                                                            points["stroke_id"])]
+
+
+def import_json(json_file_path: pathlib.Path, binary_file_path: pathlib.Path,
+                normalize_func: Callable[[list], np.ndarray], num_points: int):
+    """
+    Converts a JSON gesture file into the binary format (all samples are normalized with the given function).
+    """
+    with open(json_file_path, 'rb') as f:
+        data = f.read()
+    gestures = json.loads(data)
+
+    samples = []
+    for gesture_name, gesture_data in gestures.items():
+        for raw_points in [gesture_data["original"]] + gesture_data.get("additional_samples", []):
+            samples.append((gesture_name, raw_points, normalize_func(raw_points)))
+    BinaryTemplateFile(binary_file_path).write_all(samples, num_points, calc_source_checksum(data))
+
+
+def export_json(binary_file_path: pathlib.Path, json_file_path: Optional[pathlib.Path] = None) -> dict:
+    """
+    Converts a binary template file back into the JSON format. Only the raw points are exported, the normalized
+    points are recomputed when the JSON file is loaded.
+    """
+    sample_records, raw_points = BinaryTemplateFile(binary_file_path).map()
+    gestures = {}
+    for sample_record in sample_records:
+        gesture_name = sample_record["gesture_name"].decode("utf-8")
+        points = get_raw_points(sample_record, raw_points)
+        if gesture_name not in gestures:
+            gestures[gesture_name] = {"original": points}
+        else:
+            gestures[gesture_name].setdefault("additional_samples", []).append(points)
+
+    if json_file_path is not None:
+        with open(json_file_path, 'w') as f:
+            json.dump(gestures, f, indent=2)
+    return gestures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert gesture templates between the JSON and the binary format.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Convert a JSON gesture file into a binary template file")
+    import_parser.add_argument("json_file", type=pathlib.Path)
+    import_parser.add_argument("binary_file", type=pathlib.Path)
+    export_parser = subparsers.add_parser("export", help="Convert a binary template file into a JSON gesture file")
+    export_parser.add_argument("binary_file", type=pathlib.Path)
+    export_parser.add_argument("json_file", type=pathlib.Path)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        # imported here as the recognizer itself uses this module; the recognizer is only needed for normalizing
+        from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer
+        # the recognizer derives the template file from the given JSON file if it is missing or outdated
+        recognizer = DollarPRecognizer(template_file_path=args.binary_file, gesture_file_path=args.json_file)
+        print(f"Imported {len(recognizer.template_store)} gestures into '{args.binary_file}'.")
+    else:
+        gestures = export_json(args.binary_file, args.json_file)
+        print(f"Exported {len(gestures)} gestures to '{args.json_file}'.")
+
+
+if __name__ == "__main__":
+    main()
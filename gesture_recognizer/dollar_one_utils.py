@@ -4,9 +4,11 @@ All functions below, unless otherwise noted, have been implemented based on the
 Wobbrock, J. O., Wilson, A. D., & Li, Y. (2007, October). Gestures without libraries, toolkits or training:
 a $1 recognizer for user interface prototypes. In Proceedings of the 20th annual ACM symposium on User
 interface software and technology (pp. 159-168).
+
+All points are numpy arrays with the shape (n, 2), templates are stacked into arrays with the shape
+(num_templates, n, 2).
 """
 
-import sys
 import numpy as np
 
 
@@ -18,50 +20,37 @@ def calc_euclidean_distance(p1, p2):
     # alternatively: return np.linalg.norm(p1 - p2)
 
 
-def calc_path_length(points):
-    distance = 0.0
-    for i in range(1, len(points)):
-        last_point = points[i-1]
-        current_point = points[i]
-        distance += calc_euclidean_distance(last_point, current_point)
+def calc_path_length(points: np.ndarray) -> float:
+    return float(np.hypot(*np.diff(points, axis=0).T).sum())
 
-    return distance
 
+def calc_path_distance(point_path: np.ndarray, template_paths: np.ndarray) -> np.ndarray:
+    """
+    Returns the average distance between the corresponding points of the path and every template path (or of a stack
+    of paths and the templates, as long as the shapes can be broadcast).
+    """
+    return np.hypot(*np.moveaxis(template_paths - point_path, -1, 0)).mean(axis=-1)
 
-def calc_path_distance(point_path, template_path):
-    if len(point_path) != len(template_path):
-        print("Error! Samples A and B are not equal in length!")
-        sys.exit(1)
 
-    distance = 0
-    for i in range(1, len(point_path)):
-        distance += calc_euclidean_distance(point_path[i], template_path[i])
+def calc_centroid(points: np.ndarray) -> np.ndarray:
+    return points.mean(axis=-2)
 
-    return distance / len(point_path)
 
+def get_rotation_matrices(angles) -> np.ndarray:
+    # one 2x2 rotation matrix for every angle (in radians)
+    cos, sin = np.cos(angles), np.sin(angles)
+    return np.stack([np.stack([cos, -sin], axis=-1), np.stack([sin, cos], axis=-1)], axis=-2)
 
-def calc_centroid(points: np.ndarray):
+
+def rotate_by(points: np.ndarray, angle) -> np.ndarray:
     """
-    Function taken from the provided "Computational Geometry for Gesture Recognition" notebook.
+    Rotates the points around their centroid. If an array of angles is given, the result has the shape
+    (num_angles, n, 2) with the points rotated by every angle.
     """
-    xs, ys = zip(*points)
-    return (sum(xs) / len(xs), sum(ys) / len(ys))
-
-
-def rotate_by(points, angle):
     centroid = calc_centroid(points)
-    rotated_points = []
-    for point in points:
-        # calculate the distance of this point to the centroid of all points
-        centroid_dist_x = point[0] - centroid[0]
-        centroid_dist_y = point[1] - centroid[1]
-
-        p_x = centroid_dist_x * np.cos(angle) - centroid_dist_y * np.sin(angle) + centroid[0]
-        p_y = centroid_dist_x * np.sin(angle) + centroid_dist_y * np.cos(angle) + centroid[1]
-        rotated_point = [p_x, p_y]
-        rotated_points.append(rotated_point)
-
-    return rotated_points
+    rotation_matrices = get_rotation_matrices(angle)
+    # (points - centroid) @ R.T for every rotation matrix R
+    return np.einsum('...ij,nj->...ni', rotation_matrices, points - centroid) + centroid
 
 
 def get_bounding_box(points):
@@ -71,32 +60,44 @@ def get_bounding_box(points):
     return [(min_point[0], min_point[1]), (max_point[0], max_point[1])]
 
 
-def calc_dist_at_angle(points, template, angle):
-    new_points = rotate_by(points, angle)
-    distance = calc_path_distance(new_points, template)
-    return distance
+def calc_dist_at_angle(points: np.ndarray, templates: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    # rotate the points by a different angle for every template and compare each rotation with its template
+    return calc_path_distance(rotate_by(points, angles), templates)
 
 
-def calc_dist_at_best_angle(points, template, angle_a, angle_b, angle_delta):
+def calc_dist_at_best_angle(points: np.ndarray, templates: np.ndarray, angle_a, angle_b,
+                            angle_delta) -> np.ndarray:
+    """
+    Golden section search for the best angle (in radians) between the points and every template. The search runs
+    for all templates at the same time; as the search interval shrinks by the same factor in every step, all
+    templates need the same number of iterations.
+    """
     phi = 0.5 * (-1 + np.sqrt(5))  # value for phi taken from the paper
 
+    num_templates = len(templates)
+    angle_a = np.full(num_templates, angle_a, dtype=float)
+    angle_b = np.full(num_templates, angle_b, dtype=float)
     x1 = phi * angle_a + (1 - phi) * angle_b
     x2 = (1 - phi) * angle_a + phi * angle_b
-    f1 = calc_dist_at_angle(points, template, x1)
-    f2 = calc_dist_at_angle(points, template, x2)
-
-    while np.abs(angle_b - angle_a) > angle_delta:
-        if f1 < f2:
-            angle_b = x2
-            x2 = x1
-            f2 = f1
-            x1 = phi * angle_a + (1 - phi) * angle_b
-            f1 = calc_dist_at_angle(points, template, x1)
-        else:
-            angle_a = x1
-            x1 = x2
-            f1 = f2
-            x2 = (1 - phi) * angle_a + phi * angle_b
-            f2 = calc_dist_at_angle(points, template, x2)
-
-    return min(f1, f2)
+    f1 = calc_dist_at_angle(points, templates, x1)
+    f2 = calc_dist_at_angle(points, templates, x2)
+
+    while np.abs(angle_b[0] - angle_a[0]) > angle_delta:
+        # for templates where the first angle is better, the search continues in the left part of the interval,
+        # for all others in the right part
+        go_left = f1 < f2
+        angle_b = np.where(go_left, x2, angle_b)
+        angle_a = np.where(go_left, angle_a, x1)
+        new_x1 = np.where(go_left, phi * angle_a + (1 - phi) * angle_b, x2)
+        new_x2 = np.where(go_left, x1, (1 - phi) * angle_a + phi * angle_b)
+        new_f1 = np.where(go_left, np.nan, f2)
+        new_f2 = np.where(go_left, f1, np.nan)
+
+        # only one new angle has to be evaluated per template
+        new_angles = np.where(go_left, new_x1, new_x2)
+        new_distances = calc_dist_at_angle(points, templates, new_angles)
+        x1, x2 = new_x1, new_x2
+        f1 = np.where(go_left, new_distances, new_f1)
+        f2 = np.where(go_left, new_f2, new_distances)
+
+    return np.minimum(f1, f2)
@@ -0,0 +1,164 @@
+"""
+Vectorized version of the greedy cloud matching of the $P recognizer (see dollar_p_recognizer.py for the original
+implementation which is kept as the reference backend). Point clouds are stored as (n, 2) float arrays instead of lists
+of Point objects.
+"""
+
+import numpy as np
+
+
+# number of templates that find_nearest_matches() matches at once
+_CHUNK_SIZE = 16
+# relative tolerance for comparing lower bounds with distances to make up for floating point rounding errors
+_BOUND_TOLERANCE = 1e-9
+
+
+def calc_start_indices(n: int, eps: float = 0.50) -> np.ndarray:
+    step = int(n ** (1 - eps))
+    return np.arange(0, n, step)
+
+
+def greedy_cloud_match(points: np.ndarray, template: np.ndarray, eps: float = 0.50) -> float:
+    """
+    Same result as DollarPRecognizer.greedy_cloud_match() but the distance matrix is only computed once and the greedy
+    matching runs for all start indices and both matching directions at the same time.
+    """
+    return greedy_cloud_match_batch(points, template[np.newaxis], eps)[0]
+
+
+def calc_distance_matrices(points: np.ndarray, templates: np.ndarray) -> np.ndarray:
+    """
+    Returns the euclidean distances between every drawn point and every point of every template as an array with the
+    shape (num_templates, n, n), i.e. matrices[t, i, j] is the distance between points[i] and templates[t, j].
+    """
+    differences = points[np.newaxis, :, np.newaxis, :] - templates[:, np.newaxis, :, :]
+    return np.sqrt(np.einsum('tijk,tijk->tij', differences, differences))
+
+
+def greedy_cloud_match_batch(points: np.ndarray, templates: np.ndarray, eps: float = 0.50) -> np.ndarray:
+    """
+    Matches one point cloud against a stack of templates with the shape (num_templates, n, 2) in a single pass and
+    returns the minimum matching distance for every template.
+    """
+    num_templates, n, _ = templates.shape
+    distance_matrices = calc_distance_matrices(points, templates)
+    start_indices = calc_start_indices(n, eps)
+    num_starts = len(start_indices)
+
+    # every "run" is one start index in one direction for one template: matching the points to the template uses the
+    # distance matrix, matching the template to the points is the same as using the transposed matrix
+    directed_matrices = np.concatenate([distance_matrices, distance_matrices.transpose(0, 2, 1)])
+    template_indices = np.repeat(np.arange(num_templates), num_starts)
+    matrix_indices = np.concatenate([template_indices, template_indices + num_templates])
+    starts = np.tile(start_indices, 2 * num_templates)
+
+    dist_sums = _greedy_runs(directed_matrices, matrix_indices, starts)
+    # runs are ordered by direction first, then by template and start index
+    return dist_sums.reshape(2, num_templates, num_starts).min(axis=(0, 2))
+
+
+def find_best_match(points: np.ndarray, templates: np.ndarray, eps: float = 0.50) -> tuple[int, float]:
+    """
+    Returns the index of the best matching template and its distance, i.e. the same as taking the minimum of
+    greedy_cloud_match_batch() but without matching templates that can't win.
+    """
+    indices, distances = find_nearest_matches(points, templates, 1, eps)
+    return int(indices[0]), float(distances[0])
+
+
+def find_nearest_matches(points: np.ndarray, templates: np.ndarray, k: int,
+                         eps: float = 0.50) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the indices and distances of the k best matching templates, sorted from the best to the worst one (on
+    equal distances the template that comes first wins, like in the reference implementation).
+
+    Templates and single runs that can't beat the k-th best distance found so far are skipped or abandoned early.
+    Every drawn point is matched to some template point at least as far away as its nearest neighbour in that
+    template, so the weighted nearest neighbour distances are a lower bound for every run.
+    """
+    num_templates, n, _ = templates.shape
+    distance_matrices = calc_distance_matrices(points, templates)
+    start_indices = calc_start_indices(n, eps)
+    weights = 1 - np.arange(n) / n
+
+    # nearest neighbour distances for both matching directions: (num_templates, 2, n)
+    nearest_distances = np.stack([distance_matrices.min(axis=2), distance_matrices.min(axis=1)], axis=1)
+    # the order in which every start index visits the points: (num_starts, n)
+    visit_order = (start_indices[:, np.newaxis] + np.arange(n)) % n
+    # the lower bound for step k of a run is the weighted nearest neighbour distance: (num_templates, 2, num_starts, n)
+    step_lower_bounds = nearest_distances[:, :, visit_order] * weights
+    # the sum of the lower bounds of all steps after step k, used to abandon a run as early as possible
+    remaining_lower_bounds = np.cumsum(step_lower_bounds[..., ::-1], axis=-1)[..., ::-1]
+    run_lower_bounds = remaining_lower_bounds[..., 0]
+    remaining_lower_bounds = np.concatenate([remaining_lower_bounds[..., 1:],
+                                             np.zeros(remaining_lower_bounds.shape[:-1] + (1,))], axis=-1)
+    template_lower_bounds = run_lower_bounds.min(axis=(1, 2))
+
+    # distances of all templates matched so far; templates that were skipped or abandoned stay at infinity
+    template_distances = np.full(num_templates, np.inf)
+    max_distance = np.inf  # the k-th best distance so far
+    # the most promising templates first so the k-th best distance shrinks as fast as possible; they are matched in
+    # small chunks to stay vectorized while still being able to skip the remaining templates after every chunk
+    sorted_templates = np.argsort(template_lower_bounds, kind='stable')
+    for chunk_start in range(0, num_templates, _CHUNK_SIZE):
+        chunk = sorted_templates[chunk_start:chunk_start + _CHUNK_SIZE]
+        chunk = chunk[template_lower_bounds[chunk] <= max_distance * (1 + _BOUND_TOLERANCE)]
+        if len(chunk) == 0:
+            # the templates are sorted by their lower bound, so none of the remaining ones can win either
+            break
+
+        candidate_runs = run_lower_bounds[chunk] <= max_distance * (1 + _BOUND_TOLERANCE)
+        chunk_positions, directions, start_positions = np.nonzero(candidate_runs)
+        chunk_matrices = distance_matrices[chunk]
+        directed_matrices = np.concatenate([chunk_matrices, chunk_matrices.transpose(0, 2, 1)])
+        dist_sums = _greedy_runs(directed_matrices, directions * len(chunk) + chunk_positions,
+                                 start_indices[start_positions], max_distance,
+                                 remaining_lower_bounds[chunk[chunk_positions], directions, start_positions])
+        np.minimum.at(template_distances, chunk[chunk_positions], dist_sums)
+
+        if np.count_nonzero(np.isfinite(template_distances)) >= k:
+            max_distance = np.partition(template_distances, k - 1)[k - 1]
+
+    # sort by distance first and by template index second
+    nearest_templates = np.lexsort((np.arange(num_templates), template_distances))[:k]
+    return nearest_templates, template_distances[nearest_templates]
+
+
+def _greedy_runs(matrices: np.ndarray, matrix_indices: np.ndarray, starts: np.ndarray, max_distance: float = np.inf,
+                 remaining_lower_bounds: np.ndarray = None) -> np.ndarray:
+    """
+    Runs the greedy matching on a stack of (n, n) distance matrices. Every run uses the matrix at its matrix index and
+    its own start index. Returns the weighted distance sum for every run.
+
+    Runs whose distance sum (plus the lower bound for their remaining steps, if given as a (runs, n) array) exceeds
+    the max distance are abandoned early and reported with a distance of infinity.
+    """
+    num_runs = len(starts)
+    n = matrices.shape[1]
+    matched = np.zeros((num_runs, n), dtype=bool)
+    dist_sums = np.zeros(num_runs)
+    active_runs = np.arange(num_runs)
+    early_abandoning = np.isfinite(max_distance)
+    if early_abandoning and remaining_lower_bounds is None:
+        remaining_lower_bounds = np.zeros((num_runs, n))
+
+    for k in range(n):
+        rows = (starts[active_runs] + k) % n
+        # already matched points must not be chosen again
+        distances = np.where(matched[active_runs], np.inf, matrices[matrix_indices[active_runs], rows])
+        indices = np.argmin(distances, axis=1)
+        matched[active_runs, indices] = True
+
+        weight = 1 - k / n
+        dist_sums[active_runs] += weight * distances[np.arange(len(active_runs)), indices]
+
+        if early_abandoning:
+            lower_bounds = dist_sums[active_runs] + remaining_lower_bounds[active_runs, k]
+            abandoned = lower_bounds > max_distance * (1 + _BOUND_TOLERANCE)
+            if abandoned.any():
+                dist_sums[active_runs[abandoned]] = np.inf
+                active_runs = active_runs[~abandoned]
+                if len(active_runs) == 0:
+                    break
+
+    return dist_sums
@@ -5,11 +5,15 @@ interface prototypes. In Proceedings of the 14th ACM international conference on
 """
 
 
-import json
 import pathlib
 import sys
+import time
 from typing import Optional
 import numpy as np
+from gesture_recognizer import dollar_p_matching, resampling
+from gesture_recognizer.recognition_cache import CacheEntry, RecognitionCache
+from gesture_recognizer.recognizer_registry import PredictionResult
+from gesture_recognizer.template_store import TemplateIndex, TemplateStore, limit_samples_per_gesture
 
 
 """
@@ -36,85 +40,89 @@ class Point:
 class DollarPRecognizer:
 
     NUM_RESAMPLED_POINTS = 32
-    GESTURE_FILE_NAME = "gestures.json"
+    GESTURE_FILE_NAME = "gestures.json"  # the templates of all recognizers
+    TEMPLATE_FILE_NAME = "gestures.gtpl"  # the normalized templates, derived from the gesture file
 
     THRESHOLD = 0.3  # threshold at which we reject a gesture prediction as too bad  # TODO 0.45?
-
-    def __init__(self):
-        self.__gesture_file_path = pathlib.Path("gesture_recognizer") / self.GESTURE_FILE_NAME
-        self.existing_gestures: dict = self._load_gesture_data()
-
-    def _load_gesture_data(self):
-        # check if the file already exists
-        if self.__gesture_file_path.exists():
-            # if it does, load existing gestures
-            with open(self.__gesture_file_path, 'r') as f:
-                return json.load(f)
-        else:
-            sys.stderr.write(f"Gesture file '{self.GESTURE_FILE_NAME}' does not exist yet!")
-            return {}
+    # number of nearest samples that vote for the recognized gesture if there are several samples per gesture
+    K_NEAREST = 3
+    # the number of samples per gesture that are matched at most; of gestures with more samples, only the most
+    # different ones are matched, so recognizing stays within the latency budget however many samples are collected
+    MAX_MATCHED_SAMPLES = 16
+    # the time predict() may take at most (in ms) for the three gestures of the gesture file with hundreds of samples
+    # each, see tests/test_recognition_budget.py (run with RUN_TIMING_TESTS=1)
+    LATENCY_BUDGET_MS = 10
+
+    # "numpy" uses the vectorized matching in dollar_p_matching.py, "reference" the original implementation below
+    MATCHING_BACKENDS = ("numpy", "reference")
+
+    # number of drawn gestures whose normalized points and recognition results are cached
+    CACHE_SIZE = 128
+
+    def __init__(self, matching_backend="numpy", template_file_path=None, gesture_file_path=None):
+        if matching_backend not in self.MATCHING_BACKENDS:
+            raise ValueError(f"Unknown matching backend '{matching_backend}'! Available: {self.MATCHING_BACKENDS}")
+        self.matching_backend = matching_backend
+        # the samples that are matched (see MAX_MATCHED_SAMPLES) for the revision of the template store they belong to
+        self._matched_index: Optional[TemplateIndex] = None
+        self._matched_index_revision: Optional[int] = None
+        # created before the template store, as the store normalizes the templates through the cache as well
+        self.recognition_cache = RecognitionCache(self.CACHE_SIZE)
+
+        gesture_dir = pathlib.Path("gesture_recognizer")
+        if template_file_path is None:
+            template_file_path = gesture_dir / self.TEMPLATE_FILE_NAME
+        if gesture_file_path is None:
+            gesture_file_path = gesture_dir / self.GESTURE_FILE_NAME
+        # templates are normalized only once when they are loaded or saved and not on every prediction
+        self.template_store = TemplateStore(gesture_file_path, template_file_path, self._normalize_template,
+                                            self.NUM_RESAMPLED_POINTS)
+        self.existing_gestures: dict = self.template_store.gestures
+
+    def load(self):
+        self.template_store.load()
+        self.recognition_cache.clear_results()
 
     def save_gesture(self, gesture_name, gesture_points) -> Optional[bool]:
-        # normalize gesture before saving so it doesn't have to be done everytime again when trying to predict something
-        # normalized_gesture = self._normalize(gesture_points)
-
+        # the template store normalizes the new template immediately and saves it to the gesture file
         if self.existing_gestures.get(gesture_name):
-            print(f"A gesture with the name '{gesture_name}' does already exist!")
-            answer = input("Do you want to overwrite it? [y/n]\n")
-            if str.lower(answer) == "y" or "yes":
-                self.existing_gestures[gesture_name] = {"original": gesture_points}  # , "norm": normalized_gesture}
+            num_samples = self.template_store.get_num_samples(gesture_name)
+            print(f"A gesture with the name '{gesture_name}' does already exist ({num_samples} sample(s))!")
+            answer = input("Do you want to [a]dd it as another sample, [o]verwrite all samples or [c]ancel? [a/o/c]\n")
+            if str.lower(answer) in ("a", "add"):
+                status = self.template_store.add_sample(gesture_name, gesture_points)
+            elif str.lower(answer) in ("o", "overwrite"):
+                status = self.template_store.set_template(gesture_name, gesture_points)
             else:
                 print("\nSaving gesture cancelled.")
                 return
         else:
-            self.existing_gestures[gesture_name] = {"original": gesture_points}
+            status = self.template_store.set_template(gesture_name, gesture_points)
 
-        with open(self.__gesture_file_path, 'w') as f:
-            json.dump(self.existing_gestures, f, indent=2)  # the indent parameter makes the file more human-readable
+        # the cached results were recognized with the old templates
+        self.recognition_cache.clear_results()
+        return status
 
-        return True
+    def add_template(self, gesture_name, gesture_points) -> bool:
+        # an existing gesture gets the points as another sample
+        status = self.template_store.add_sample(gesture_name, gesture_points)
+        self.recognition_cache.clear_results()
+        return status
 
     def get_all_gestures(self):
         return self.existing_gestures
 
-    def resample_points(self, original_points: list[Point], n: int):
-        step_size = self.calc_path_length(original_points) / (n - 1)
-        current_distance = 0
-        new_points = [original_points[0]]  # create a new array and init with the first point
-
-        i = 1
-        while i < len(original_points):
-            last_point = original_points[i - 1]
-            current_point = original_points[i]
+    def _normalize_template(self, template_points: list) -> np.ndarray:
+        # a template that has just been drawn and recognized doesn't have to be normalized again
+        normalized_template = self._get_cache_entry(template_points).normalized_points
+        return np.array([(point.x, point.y) for point in normalized_template])
 
-            if current_point.stroke_id == last_point.stroke_id:
-                d = self.calc_euclidean_distance(last_point, current_point)
-
-                if (current_distance + d) >= step_size:
-                    # if the distance to the next point is greater than the step size, we have to calculated
-                    # a new resampled point
-                    px = last_point.x + ((step_size - current_distance) / d) * (current_point.x - last_point.x)
-                    py = last_point.y + ((step_size - current_distance) / d) * (current_point.y - last_point.y)
-                    resampled_point = Point(px, py)
-                    resampled_point.stroke_id = current_point.stroke_id
-                    new_points.append(resampled_point)
-
-                    # insert the new resampled point at the next position in the original list, so it will be the next
-                    # current_point!
-                    original_points.insert(i, resampled_point)
-                    current_distance = 0  # very important to reset the current position!
-                else:
-                    # step size was not reached, just go further
-                    current_distance += d
-            i += 1
-
-        if len(new_points) == n - 1:
-            # the last point isn't added anymore, so to make sure we still have the specified
-            # number of resampled points we add the last point in the original array at the end manually
-            last_point = original_points[len(original_points) - 1]
-            new_points.append(Point(last_point.x, last_point.y, last_point.stroke_id))
-
-        return new_points
+    def resample_points(self, original_points: list[Point], n: int):
+        # the original points are not modified, the result always has exactly n points
+        points = np.array([(point.x, point.y) for point in original_points], dtype=float)
+        stroke_ids = np.array([point.stroke_id for point in original_points], dtype=object)
+        resampled_points, resampled_stroke_ids = resampling.resample_strokes(points, stroke_ids, n)
+        return [Point(x, y, stroke_id) for (x, y), stroke_id in zip(resampled_points, resampled_stroke_ids)]
 
     def scale_to_square(self, points: list[Point]):
         x_min, y_min = np.inf, np.inf
@@ -175,10 +183,20 @@ class DollarPRecognizer:
     def normalize(self, points: list[Point]):
         # use all the processing functions from above to transform our set of points into the desired shape
         resampled_points = self.resample_points(points, self.NUM_RESAMPLED_POINTS)
+        return self.normalize_resampled(resampled_points)
+
+    def normalize_resampled(self, resampled_points: list[Point]):
+        # the remaining steps of normalize() for points that have already been resampled (e.g. by the streaming
+        # recognizer which resamples incrementally while the gesture is drawn)
         scaled_points = self.scale_to_square(resampled_points)
         translated_points = self.translate_to_origin(scaled_points, self.NUM_RESAMPLED_POINTS)
         return translated_points
 
+    def recognize_resampled(self, resampled_points: list[Point]):
+        # normalizes and recognizes points that have already been resampled, see recognize() for the result
+        self._reload_templates_if_changed()
+        return self.recognize(self.normalize_resampled(resampled_points))
+
     def cloud_distance(self, points: list[Point], templates: list[Point], n: int, start: int):
         matched = [False] * n
         dist_sum = 0
@@ -225,41 +243,154 @@ class DollarPRecognizer:
             print("There are no templates!\n")
             return None
 
-        # normalize input points
-        drawn_points = [Point(*p) for p in input_points]
-        normalized_gesture = self.normalize(drawn_points)
-
         # try to find the correct gesture
-        recognition_result = self.recognize(normalized_gesture)
+        prediction = self.predict(input_points)
 
-        if recognition_result is not None:
-            best_template, score = recognition_result
-            print(f"{best_template}   (Score / Probability: {score:.3f})")
+        if prediction.template_name is not None:
+            print(f"{prediction.template_name}   (Score / Probability: {prediction.score:.3f}, "
+                  f"{prediction.duration_ms:.2f} ms)")
             # only change the player form if the score is good enough, if not we keep the current form
-            if score > self.THRESHOLD:
-                return best_template
+            return prediction.gesture
         else:
             print("Couldn't predict a gesture!")
         return None
 
+    def predict(self, input_points) -> PredictionResult:
+        start_time = time.perf_counter()
+        ranking = []
+        if len(input_points) >= 2:
+            ranking = self._recognize_cached(input_points)
+        return self._create_prediction_result(ranking, start_time)
+
+    def predict_topk(self, input_points, k) -> PredictionResult:
+        """
+        Unlike predict(), the ranking isn't based on the votes of the nearest samples but on the best sample of every
+        gesture (see recognize_batch()).
+        """
+        start_time = time.perf_counter()
+        ranking = []
+        if len(input_points) >= 2:
+            self._reload_templates_if_changed()
+            ranking = self.recognize_batch(self._get_cache_entry(input_points).normalized_points)[:k]
+        return self._create_prediction_result(ranking, start_time)
+
+    def _normalize_input(self, input_points):
+        # normalize input points
+        drawn_points = [Point(*p) for p in input_points]
+        return self.normalize(drawn_points)
+
+    def _get_cache_entry(self, input_points) -> CacheEntry:
+        """
+        Returns the cache entry for the input points; the points are normalized if they are not in the cache yet.
+        """
+        key = self.recognition_cache.make_key(input_points)
+        entry = self.recognition_cache.get(key)
+        if entry is None:
+            entry = self.recognition_cache.put(key, CacheEntry(self._normalize_input(input_points), None))
+        return entry
+
+    def _reload_templates_if_changed(self):
+        # the gesture file might have been edited or changed by another recognizer
+        if self.template_store.reload_if_changed():
+            self.recognition_cache.clear_results()
+
+    def _recognize_cached(self, input_points) -> list[tuple[str, float]]:
+        self._reload_templates_if_changed()
+        key = self.recognition_cache.make_key(input_points)
+        entry = self.recognition_cache.get(key)
+        if entry is None:
+            entry = CacheEntry(self._normalize_input(input_points), None)
+        if entry.ranking is None:
+            recognition_result = self.recognize(entry.normalized_points)
+            entry = self.recognition_cache.put(key, entry._replace(
+                ranking=[recognition_result] if recognition_result is not None else []))
+        return entry.ranking
+
+    def _get_template_index(self) -> TemplateIndex:
+        if self._matched_index_revision != self.template_store.revision:
+            self._matched_index = limit_samples_per_gesture(self.template_store.get_template_index(),
+                                                            self.MAX_MATCHED_SAMPLES)
+            self._matched_index_revision = self.template_store.revision
+        return self._matched_index
+
+    def _create_prediction_result(self, ranking: list[tuple[str, float]], start_time: float) -> PredictionResult:
+        gesture = ranking[0][0] if ranking and ranking[0][1] > self.THRESHOLD else None
+        return PredictionResult(gesture, ranking, (time.perf_counter() - start_time) * 1000)
+
     def recognize(self, points: list[Point]):
-        result_template = None
-        score = np.inf
-        for template_name, template_data in self.existing_gestures.items():
-            # quite inefficient to do this every time; SHOULD be done already when saving the template to json but
-            # then the point class must be made Serializable and be converted back when reading from json file!
-            template_points = template_data.get("original")
-            drawn_template_points = [Point(*p) for p in template_points]  # TODO stroke_id not used in templates
-            normalized_template = self.normalize(drawn_template_points)
-
-            dist = self.greedy_cloud_match(points, normalized_template)
-            if score > dist:
-                score = dist
-                result_template = template_name
+        """
+        Returns the gesture with the most votes among the k nearest samples and the score of its best sample. With
+        only one sample per gesture this is simply the best matching gesture.
+        """
+        template_index = self._get_template_index()
+        if len(template_index.points) == 0:
+            return
 
-        # additional score function was taken from https://github.com/sonovice/dollarpy
-        score = max((2 - score) / 2, 0)
-        if result_template is None or score == 0:
+        if self.matching_backend == "numpy":
+            # only the nearest samples are needed, so samples that can't be among them are skipped early
+            drawn_cloud = np.array([(point.x, point.y) for point in points])
+            nearest_samples, distances = dollar_p_matching.find_nearest_matches(drawn_cloud, template_index.points,
+                                                                                self.K_NEAREST)
+        else:
+            all_distances = np.array(self._match_all_samples_reference(points, template_index))
+            nearest_samples = np.argsort(all_distances, kind='stable')[:self.K_NEAREST]
+            distances = all_distances[nearest_samples]
+
+        result_template, distance = self._vote(template_index, nearest_samples, distances)
+        score = self._calc_score(distance)
+        if score == 0:
             return
 
         return result_template, score
+
+    def _vote(self, template_index, nearest_samples: np.ndarray, distances: np.ndarray) -> tuple[Optional[str], float]:
+        votes = {}  # gesture index -> [number of votes, best distance]
+        for sample, distance in zip(nearest_samples, distances):
+            if not np.isfinite(distance):
+                continue
+            gesture = template_index.sample_gestures[sample]
+            if gesture not in votes:
+                votes[gesture] = [0, distance]
+            votes[gesture][0] += 1
+        if not votes:
+            # no sample could be matched at all: an infinite distance gives a score of 0, i.e. no match
+            return None, np.inf
+
+        # the most votes win; on a tie the gesture with the nearest sample wins (the samples are already sorted by
+        # distance, so the first gesture in the dict has the nearest sample)
+        best_gesture = max(votes, key=lambda g: votes[g][0])
+        return template_index.gesture_names[best_gesture], votes[best_gesture][1]
+
+    def recognize_batch(self, points: list[Point]) -> list[tuple[str, float]]:
+        """
+        Scores the normalized gesture against all templates and returns a list of (template name, score) tuples,
+        ranked from the best to the worst match. The score of a gesture is the score of its best matching sample.
+        """
+        template_index = self._get_template_index()
+        if len(template_index.points) == 0:
+            return []
+
+        sample_distances = self._match_all_samples(points, template_index)
+        distances = np.full(len(template_index.gesture_names), np.inf)
+        np.minimum.at(distances, template_index.sample_gestures, sample_distances)
+        scores = [self._calc_score(dist) for dist in distances]
+        # sorted() is stable, so templates with the same score stay in the order of the gesture file
+        return sorted(zip(template_index.gesture_names, scores), key=lambda result: result[1], reverse=True)
+
+    def _match_all_samples(self, points: list[Point], template_index):
+        if self.matching_backend == "numpy":
+            # match against all samples at once
+            drawn_cloud = np.array([(point.x, point.y) for point in points])
+            return dollar_p_matching.greedy_cloud_match_batch(drawn_cloud, template_index.points)
+        return self._match_all_samples_reference(points, template_index)
+
+    def _match_all_samples_reference(self, points: list[Point], template_index) -> list[float]:
+        distances = []
+        for sample in template_index.points:
+            template_points = [Point(x, y) for x, y in sample]
+            distances.append(self.greedy_cloud_match(points, template_points))
+        return distances
+
+    def _calc_score(self, distance) -> float:
+        # additional score function was taken from https://github.com/sonovice/dollarpy
+        return float(max((2 - distance) / 2, 0))
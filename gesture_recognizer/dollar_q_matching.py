@@ -0,0 +1,192 @@
+"""
+Point cloud matching in the style of the $Q recognizer:
+Vatavu, R. D., Anthony, L., & Wobbrock, J. O. (2018, September). $Q: A super-quick, articulation-invariant
+stroke-gesture recognizer for low-resource devices. In Proceedings of the 20th International Conference on
+Human-Computer Interaction with Mobile Devices and Services (pp. 1-12).
+
+Every template gets a lookup table when it is loaded: a coarse grid over the normalized coordinate space that stores
+for every cell the distance to the nearest template point. With it, a lower bound for matching the drawn points to a
+template only needs one table lookup per point instead of a full distance matrix. Other than in the paper, the table
+stores the distance from the closest position within the cell (and not from the cell center), so the bounds are exact
+and the result is always the same as matching every template completely.
+
+The clouds must be normalized to the coordinate range [-1, 1] (see DollarQRecognizer.normalize_cloud()).
+"""
+
+from typing import NamedTuple
+import numpy as np
+from gesture_recognizer.dollar_p_matching import calc_distance_matrices, calc_start_indices
+
+
+GRID_SIZE = 64  # number of cells per axis, as in the paper
+GRID_MIN, GRID_MAX = -1.0, 1.0
+CELL_SIZE = (GRID_MAX - GRID_MIN) / (GRID_SIZE - 1)
+
+# number of templates that find_nearest_matches() matches at once
+_CHUNK_SIZE = 16
+# relative tolerance for comparing lower bounds with distances to make up for floating point rounding errors
+_BOUND_TOLERANCE = 1e-9
+# the runs are only checked for early abandoning every few steps, as removing runs costs more than continuing them
+_ABANDON_CHECK_INTERVAL = 4
+
+
+class TemplateLookup(NamedTuple):
+    tables: np.ndarray  # distance from every cell to the nearest template point, shape (num_templates, num_cells)
+    used_cell_centers: np.ndarray  # the centers of all cells that contain a template point, shape (num_cells, 2)
+    # the position of the cell of every template point in used_cell_centers, shape (num_templates, num_points)
+    template_cells: np.ndarray
+
+
+def get_cell_centers() -> np.ndarray:
+    coordinates = np.linspace(GRID_MIN, GRID_MAX, GRID_SIZE)
+    grid_x, grid_y = np.meshgrid(coordinates, coordinates, indexing='ij')
+    return np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+
+def calc_cell_distances(cell_centers: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    Returns the distance from every cell to its nearest point, i.e. the smallest distance between any position within
+    the cell and any of the points, shape (num_cells,).
+    """
+    # the distance to the cell border along both axes (zero if the point is within the cell in that direction)
+    axis_distances = np.maximum(np.abs(cell_centers[:, np.newaxis, :] - points[np.newaxis, :, :]) - CELL_SIZE / 2, 0)
+    return np.sqrt(np.einsum('cjk,cjk->cj', axis_distances, axis_distances).min(axis=1))
+
+
+def to_cells(points: np.ndarray) -> np.ndarray:
+    """
+    Returns the index of the nearest cell center (in the flattened grid) for every point.
+    """
+    grid_positions = np.rint((points - GRID_MIN) / CELL_SIZE).astype(int)
+    grid_positions = np.clip(grid_positions, 0, GRID_SIZE - 1)
+    return grid_positions[..., 0] * GRID_SIZE + grid_positions[..., 1]
+
+
+def build_template_lookup(templates: np.ndarray) -> TemplateLookup:
+    """
+    Computes the lookup tables for a stack of templates with the shape (num_templates, n, 2). Done once when the
+    templates are loaded, the cost is (num_templates * GRID_SIZE² * n).
+    """
+    cell_centers = get_cell_centers()
+    tables = np.empty((len(templates), len(cell_centers)))
+    for i, template in enumerate(templates):
+        tables[i] = calc_cell_distances(cell_centers, template)
+    used_cells, template_cells = np.unique(to_cells(templates), return_inverse=True)
+    return TemplateLookup(tables, cell_centers[used_cells], template_cells.reshape(templates.shape[:2]))
+
+
+def calc_nearest_lower_bounds(points: np.ndarray, lookup: TemplateLookup) -> np.ndarray:
+    """
+    Returns lower bounds for the nearest neighbour distances in both matching directions as (num_templates, 2, n)
+    array: [:, 0] for every drawn point to the nearest template point, [:, 1] for every template point to the nearest
+    drawn point.
+    """
+    points_to_template = lookup.tables[:, to_cells(points)]
+    # the other direction needs the distance from the cells of the template points to the drawn points; only the
+    # cells that are actually used by some template are computed
+    template_to_points = calc_cell_distances(lookup.used_cell_centers, points)[lookup.template_cells]
+    return np.stack([points_to_template, template_to_points], axis=1)
+
+
+def calc_run_lower_bounds(nearest_distances: np.ndarray, start_indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Turns (num_templates, 2, n) nearest neighbour distances (or lower bounds for them) into lower bounds for every
+    matching run: the bound for the whole run (num_templates, 2, num_starts) and the bound for the steps after step k
+    (num_templates, 2, num_starts, n), used to abandon a run as early as possible.
+    """
+    n = nearest_distances.shape[-1]
+    weights = 1 - np.arange(n) / n
+    visit_order = (start_indices[:, np.newaxis] + np.arange(n)) % n
+    step_lower_bounds = nearest_distances[:, :, visit_order] * weights
+    remaining_lower_bounds = np.cumsum(step_lower_bounds[..., ::-1], axis=-1)[..., ::-1]
+    run_lower_bounds = remaining_lower_bounds[..., 0]
+    remaining_lower_bounds = np.concatenate([remaining_lower_bounds[..., 1:],
+                                             np.zeros(remaining_lower_bounds.shape[:-1] + (1,))], axis=-1)
+    return run_lower_bounds, remaining_lower_bounds
+
+
+def find_nearest_matches(points: np.ndarray, templates: np.ndarray, lookup: TemplateLookup, k: int,
+                         eps: float = 0.50) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Same result as dollar_p_matching.find_nearest_matches(), i.e. the indices and distances of the k best matching
+    templates. The lower bounds from the lookup tables are used to skip whole templates, so the distance matrices are
+    only computed for the templates that might be among the k best ones. Within these, the exact nearest neighbour
+    distances from the distance matrices give tighter bounds for skipping and abandoning single runs.
+    """
+    num_templates, n, _ = templates.shape
+    start_indices = calc_start_indices(n, eps)
+    weights = 1 - np.arange(n) / n
+    visit_order = (start_indices[:, np.newaxis] + np.arange(n)) % n
+
+    template_lower_bounds = calc_run_lower_bounds(calc_nearest_lower_bounds(points, lookup),
+                                                  start_indices)[0].min(axis=(1, 2))
+
+    template_distances = np.full(num_templates, np.inf)
+    max_distance = np.inf  # the k-th best distance so far
+    sorted_templates = np.argsort(template_lower_bounds, kind='stable')
+    # the first chunk only contains as many templates as needed for a first k-th best distance, so all further
+    # templates can already be checked against it
+    chunk_ends = [k] + list(range(k + _CHUNK_SIZE, num_templates, _CHUNK_SIZE)) + [num_templates]
+    chunk_start = 0
+    for chunk_end in chunk_ends:
+        chunk = sorted_templates[chunk_start:chunk_end]
+        chunk_start = chunk_end
+        chunk = chunk[template_lower_bounds[chunk] <= max_distance * (1 + _BOUND_TOLERANCE)]
+        if len(chunk) == 0:
+            # the templates are sorted by their lower bound, so none of the remaining ones can win either
+            break
+
+        distance_matrices = calc_distance_matrices(points, templates[chunk])
+        nearest_distances = np.stack([distance_matrices.min(axis=2), distance_matrices.min(axis=1)], axis=1)
+        run_lower_bounds, remaining_lower_bounds = calc_run_lower_bounds(nearest_distances, start_indices)
+        chunk_positions, directions, start_positions = np.nonzero(
+            run_lower_bounds <= max_distance * (1 + _BOUND_TOLERANCE))
+
+        directed_matrices = np.concatenate([distance_matrices, distance_matrices.transpose(0, 2, 1)])
+        # the rows of every run in the order in which the run visits them: (runs, n, n)
+        run_matrices = directed_matrices[(directions * len(chunk) + chunk_positions)[:, np.newaxis],
+                                         visit_order[start_positions]]
+        dist_sums = _greedy_runs(run_matrices, weights, max_distance,
+                                 remaining_lower_bounds[chunk_positions, directions, start_positions])
+        np.minimum.at(template_distances, chunk[chunk_positions], dist_sums)
+
+        if np.count_nonzero(np.isfinite(template_distances)) >= k:
+            max_distance = np.partition(template_distances, k - 1)[k - 1]
+
+    # sort by distance first and by template index second
+    nearest_templates = np.lexsort((np.arange(num_templates), template_distances))[:k]
+    return nearest_templates, template_distances[nearest_templates]
+
+
+def _greedy_runs(run_matrices: np.ndarray, weights: np.ndarray, max_distance: float,
+                 remaining_lower_bounds: np.ndarray) -> np.ndarray:
+    """
+    Runs the greedy matching for a stack of (n, n) distance matrices whose rows are already in the visiting order of
+    the run, so step k of every run uses row k. The matrices are modified. Returns the weighted distance sum for every
+    run; runs that can't get below the max distance are abandoned and reported with a distance of infinity.
+    """
+    num_runs, n, _ = run_matrices.shape
+    dist_sums = np.full(num_runs, np.inf)
+    active_runs = np.arange(num_runs)
+    active_sums = np.zeros(num_runs)
+    run_positions = np.arange(num_runs)
+
+    for k in range(n):
+        indices = np.argmin(run_matrices[:, k, :], axis=1)
+        active_sums += weights[k] * run_matrices[run_positions, k, indices]
+        # a matched point can't be chosen again, so its column is set to infinity for the remaining steps
+        run_matrices[run_positions, k:, indices] = np.inf
+
+        if k % _ABANDON_CHECK_INTERVAL == 0:
+            continued = active_sums + remaining_lower_bounds[:, k] <= max_distance * (1 + _BOUND_TOLERANCE)
+            if not continued.all():
+                active_runs = active_runs[continued]
+                if len(active_runs) == 0:
+                    return dist_sums
+                active_sums = active_sums[continued]
+                run_matrices = run_matrices[continued]
+                remaining_lower_bounds = remaining_lower_bounds[continued]
+                run_positions = np.arange(len(active_runs))
+
+    dist_sums[active_runs] = active_sums
+    return dist_sums
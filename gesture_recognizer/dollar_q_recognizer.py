@@ -0,0 +1,95 @@
+"""
+Recognizer in the style of the $Q recognizer (see dollar_q_matching.py for the paper). It uses the same greedy cloud
+matching as the $P recognizer, but every template gets a lookup table when it is loaded that gives cheap lower bounds,
+so most templates and matching runs can be skipped or abandoned early.
+
+The point clouds are normalized with numpy arrays instead of lists of Point objects. As the normalized templates are
+not the same as the ones of the $P recognizer, they are derived from the gesture file into a template file of their
+own.
+"""
+
+from typing import Optional
+import numpy as np
+from gesture_recognizer import dollar_p_matching, dollar_q_matching, resampling
+from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer, Point
+from gesture_recognizer.template_store import TemplateIndex
+
+
+class DollarQRecognizer(DollarPRecognizer):
+
+    TEMPLATE_FILE_NAME = "gestures_q.gtpl"
+
+    def __init__(self, template_file_path=None, gesture_file_path=None):
+        # the lookup tables of the current templates; built lazily for the revision of the template store they belong
+        # to (no reference to the index is kept, as its memory map must be released before the file is rewritten)
+        self._template_lookup: Optional[dollar_q_matching.TemplateLookup] = None
+        self._lookup_revision: Optional[int] = None
+        super().__init__(template_file_path=template_file_path, gesture_file_path=gesture_file_path)
+
+    def normalize_cloud(self, points: np.ndarray, stroke_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Resamples the points (shape (num_points, 2)) and scales and translates them into the range [-1, 1] with the
+        centroid at the origin. Returns the normalized cloud with the shape (NUM_RESAMPLED_POINTS, 2).
+        """
+        if stroke_ids is None:
+            resampled_points = resampling.resample(points, self.NUM_RESAMPLED_POINTS)
+        else:
+            resampled_points, _ = resampling.resample_strokes(points, stroke_ids, self.NUM_RESAMPLED_POINTS)
+        return self._scale_and_translate(resampled_points)
+
+    def _scale_and_translate(self, resampled_points: np.ndarray) -> np.ndarray:
+        min_point = resampled_points.min(axis=0)
+        # a single dot has no extent at all, so it isn't scaled
+        scale_factor = max(float((resampled_points.max(axis=0) - min_point).max()), 1e-9)
+        scaled_points = (resampled_points - min_point) / scale_factor
+        return scaled_points - scaled_points.mean(axis=0)
+
+    def _normalize_input(self, input_points) -> np.ndarray:
+        points = np.array([point[:2] for point in input_points], dtype=float)
+        stroke_ids = [point[2] if len(point) > 2 else None for point in input_points]
+        return self.normalize_cloud(points, np.array(stroke_ids, dtype=object))
+
+    def _normalize_template(self, template_points: list) -> np.ndarray:
+        return self._get_cache_entry(template_points).normalized_points
+
+    def normalize(self, points: list[Point]) -> np.ndarray:
+        return self.normalize_cloud(np.array([(point.x, point.y) for point in points], dtype=float),
+                                    np.array([point.stroke_id for point in points], dtype=object))
+
+    def normalize_resampled(self, resampled_points: list[Point]) -> np.ndarray:
+        # used by the streaming recognizer, which resamples the points itself
+        return self._scale_and_translate(np.array([(point.x, point.y) for point in resampled_points], dtype=float))
+
+    def _get_template_lookup(self, template_index: TemplateIndex) -> dollar_q_matching.TemplateLookup:
+        # the template store creates a new index whenever the templates change, so the tables are rebuilt then as well
+        if self._lookup_revision != self.template_store.revision:
+            self._template_lookup = dollar_q_matching.build_template_lookup(template_index.points)
+            self._lookup_revision = self.template_store.revision
+        return self._template_lookup
+
+    def recognize(self, points: np.ndarray):
+        """
+        Same as DollarPRecognizer.recognize() but for a normalized cloud as numpy array.
+        """
+        template_index = self._get_template_index()
+        if len(template_index.points) == 0:
+            return
+
+        # with a single sample per gesture the vote of the k nearest samples always goes to the nearest one, so only
+        # the nearest sample has to be found, which allows skipping much more
+        k = self.K_NEAREST if len(template_index.points) > len(template_index.gesture_names) else 1
+        # the templates are matched in the float32 of the memory-mapped template file; only the few templates that
+        # are actually matched are read, the distances are computed in float64 anyway
+        nearest_samples, distances = dollar_q_matching.find_nearest_matches(
+            points, template_index.points, self._get_template_lookup(template_index), k)
+
+        result_template, distance = self._vote(template_index, nearest_samples, distances)
+        score = self._calc_score(distance)
+        if score == 0:
+            return
+
+        return result_template, score
+
+    def _match_all_samples(self, points: np.ndarray, template_index: TemplateIndex) -> np.ndarray:
+        # used by recognize_batch(), which needs the distances to all samples, so nothing can be skipped
+        return dollar_p_matching.greedy_cloud_match_batch(points, template_index.points)
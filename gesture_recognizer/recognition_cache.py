@@ -0,0 +1,92 @@
+"""
+LRU cache for the normalized point clouds and recognition results of drawn gestures. The game often sees (nearly) the
+same stroke several times, e.g. when a gesture is saved again after a failed attempt, so the points are quantized
+before they are hashed and near-identical strokes share one entry.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+import numpy as np
+
+
+class CacheEntry(NamedTuple):
+    normalized_points: Any  # whatever the recognizer's normalization returns
+    ranking: Optional[list]  # the recognition result as (template name, score) tuples; None if not recognized yet
+
+
+class RecognitionCache:
+    """
+    Thread-safe, as the recognizer may be used by the game loop and a worker thread at the same time.
+    """
+
+    def __init__(self, max_size=128, quantization=2.0):
+        """
+        max_size: the maximum number of entries, the least recently used entry is removed first (0 disables the cache)
+        quantization: the grid size (in pixels) the points are rounded to before they are hashed
+        """
+        self.max_size = max_size
+        self.quantization = quantization
+        self._entries: OrderedDict[bytes, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, input_points: list) -> bytes:
+        """
+        Returns the key for points in the form [(x, y, stroke_id), ...] or [(x, y), ...].
+        """
+        coordinates = np.array([point[:2] for point in input_points], dtype=float)
+        quantized_coordinates = np.rint(coordinates / self.quantization).astype(np.int64)
+        stroke_ids = tuple(point[2] if len(point) > 2 else None for point in input_points)
+        return hashlib.blake2b(quantized_coordinates.tobytes() + repr(stroke_ids).encode(), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: bytes, entry: CacheEntry) -> CacheEntry:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear_results(self):
+        """
+        Drops all recognition results but keeps the normalized points, e.g. after the templates have changed.
+        """
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                self._entries[key] = entry._replace(ranking=None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            num_lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / num_lookups if num_lookups else 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # locks can't be pickled, e.g. when the recognizer is sent to a worker process
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
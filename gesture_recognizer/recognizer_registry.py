@@ -0,0 +1,100 @@
+"""
+Registry of the available gesture recognizer backends. Every backend implements the GestureRecognizer protocol, so the
+game (or the benchmark) can create any of them by name, e.g.:
+    recognizer = create_recognizer("dollar_one")
+    result = recognizer.predict(points)
+    print(result.gesture, result.duration_ms)
+
+New backends only have to be registered here with register_backend().
+"""
+
+from typing import Callable, NamedTuple, Optional, Protocol
+
+
+class PredictionResult(NamedTuple):
+    gesture: Optional[str]  # the recognized gesture, None if the best score was below the recognizer's threshold
+    ranking: list[tuple[str, float]]  # (template name, score) tuples, best match first
+    duration_ms: float  # how long the prediction took (including the normalization of the input points)
+
+    @property
+    def template_name(self) -> Optional[str]:
+        # the best matching template, even if its score wasn't good enough
+        return self.ranking[0][0] if self.ranking else None
+
+    @property
+    def score(self) -> float:
+        return self.ranking[0][1] if self.ranking else 0.0
+
+
+class GestureRecognizer(Protocol):
+
+    def load(self):
+        """
+        (Re-)loads all templates from the gesture file.
+        """
+
+    def predict(self, input_points: list) -> PredictionResult:
+        """
+        Recognizes the drawn points in the form [(x, y, stroke_id), ...] or [(x, y), ...].
+        """
+
+    def predict_topk(self, input_points: list, k: int) -> PredictionResult:
+        """
+        Same as predict() but the ranking contains the k best matching templates.
+        """
+
+    def add_template(self, gesture_name: str, gesture_points: list) -> bool:
+        """
+        Adds the points as template for the given gesture without asking and saves it to the gesture file.
+        """
+
+    # used by the game
+    def predict_gesture(self, input_points: list) -> Optional[str]: ...
+
+    def save_gesture(self, gesture_name: str, gesture_points: list) -> Optional[bool]: ...
+
+    def get_all_gestures(self) -> dict: ...
+
+
+RECOGNIZER_BACKENDS: dict[str, Callable[[], GestureRecognizer]] = {}
+
+
+def register_backend(name: str, factory: Callable[[], GestureRecognizer]):
+    RECOGNIZER_BACKENDS[name] = factory
+
+
+def get_backend_names() -> list[str]:
+    return list(RECOGNIZER_BACKENDS)
+
+
+def create_recognizer(name: str) -> GestureRecognizer:
+    if name not in RECOGNIZER_BACKENDS:
+        raise ValueError(f"Unknown recognizer backend '{name}'! Available: {get_backend_names()}")
+    return RECOGNIZER_BACKENDS[name]()
+
+
+# the recognizers are imported in the factories as they use the PredictionResult from this module themselves
+def _create_dollar_p_recognizer() -> GestureRecognizer:
+    from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer
+    return DollarPRecognizer()
+
+
+def _create_dollar_p_reference_recognizer() -> GestureRecognizer:
+    from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer
+    return DollarPRecognizer(matching_backend="reference")
+
+
+def _create_dollar_q_recognizer() -> GestureRecognizer:
+    from gesture_recognizer.dollar_q_recognizer import DollarQRecognizer
+    return DollarQRecognizer()
+
+
+def _create_dollar_one_recognizer() -> GestureRecognizer:
+    from gesture_recognizer.dollar_one_recognizer import DollarOneRecognizer
+    return DollarOneRecognizer()
+
+
+register_backend("dollar_p", _create_dollar_p_recognizer)
+register_backend("dollar_p_reference", _create_dollar_p_reference_recognizer)
+register_backend("dollar_q", _create_dollar_q_recognizer)
+register_backend("dollar_one", _create_dollar_one_recognizer)
@@ -0,0 +1,65 @@
+"""
+Resampling of drawn paths into a fixed number of equidistant points, used by the $1 and the $P recognizer.
+
+Instead of walking along the path and inserting every new point into it (as in the pseudocode of the papers), the arc
+length from the first point to every point is computed once and all target positions are interpolated in a single
+step. The input points are never modified and the result always has exactly n points.
+"""
+
+from typing import Optional
+import numpy as np
+
+
+def calc_cumulative_lengths(points: np.ndarray, stroke_ids: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Returns the arc length from the first point to every point of the (n, 2) points. If stroke ids are given, the
+    last point of a stroke and the first point of the next one are not connected, i.e. the gap between strokes doesn't
+    count towards the path length.
+    """
+    segment_lengths = np.hypot(*np.diff(points, axis=0).T)
+    if stroke_ids is not None:
+        stroke_ids = np.asarray(stroke_ids)
+        segment_lengths[stroke_ids[1:] != stroke_ids[:-1]] = 0.0
+    return np.concatenate([[0.0], np.cumsum(segment_lengths)])
+
+
+def resample_path(points: np.ndarray, cumulative_lengths: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns n points that are equally spaced along the path, as well as the index of the original point that ends the
+    segment every new point lies on (e.g. to look up its stroke id). The first and the last new point are the first and
+    the last original point.
+    """
+    num_points = len(points)
+    if num_points < 2 or cumulative_lengths[-1] == 0:
+        # there is no path to walk along, so all new points are at the position of the first one
+        return np.repeat(points[:1], n, axis=0).astype(float), np.zeros(n, dtype=int)
+
+    target_lengths = np.linspace(0, cumulative_lengths[-1], n)
+    # index of the first point whose arc length is not smaller than the target, i.e. the end of the segment
+    segment_ends = np.clip(np.searchsorted(cumulative_lengths, target_lengths, side='left'), 1, num_points - 1)
+    segment_starts = segment_ends - 1
+    segment_lengths = cumulative_lengths[segment_ends] - cumulative_lengths[segment_starts]
+    # segments between two strokes or between duplicated points have a length of zero
+    fractions = np.divide(target_lengths - cumulative_lengths[segment_starts], segment_lengths,
+                          out=np.zeros(n), where=segment_lengths > 0)
+    resampled = points[segment_starts] + fractions[:, np.newaxis] * (points[segment_ends] - points[segment_starts])
+    return resampled, segment_ends
+
+
+def resample(points: np.ndarray, n: int) -> np.ndarray:
+    """
+    Resamples a single stroke given as (num_points, 2) array into n points.
+    """
+    points = np.asarray(points, dtype=float)
+    resampled, _ = resample_path(points, calc_cumulative_lengths(points), n)
+    return resampled
+
+
+def resample_strokes(points: np.ndarray, stroke_ids: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Resamples a gesture consisting of one or more strokes into n points. Returns the new points and their stroke ids.
+    """
+    points = np.asarray(points, dtype=float)
+    stroke_ids = np.asarray(stroke_ids)
+    resampled, segment_ends = resample_path(points, calc_cumulative_lengths(points, stroke_ids), n)
+    return resampled, stroke_ids[segment_ends]
@@ -0,0 +1,163 @@
+"""
+Streaming mode for the $P recognizer: the gesture is recognized while it is still being drawn, so in most cases the
+final result is already known when the player releases the mouse button.
+"""
+
+import threading
+from typing import Callable, NamedTuple, Optional
+import numpy as np
+from gesture_recognizer import resampling
+from gesture_recognizer.async_recognizer import AsyncGestureRecognizer
+from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer, Point
+
+
+class ProvisionalResult(NamedTuple):
+    template_name: str
+    score: float  # the score of the best template, used as the confidence of this result
+    accepted: bool  # whether the score is above the recognizer's threshold
+    num_points: int  # number of drawn points this result is based on
+
+    @property
+    def gesture(self) -> Optional[str]:
+        # the gesture that should be applied, i.e. the template name only if the score is good enough
+        return self.template_name if self.accepted else None
+
+
+class StreamingGestureRecognizer:
+    """
+    Collects the points of a gesture one by one and keeps the cumulative arc length of the drawn path up to date with
+    every new point, so resampling only needs a single interpolation step instead of walking the whole path again.
+    """
+
+    # re-evaluate after this many new points, even if the player is still moving the mouse
+    EVALUATION_INTERVAL = 4
+    INITIAL_CAPACITY = 256
+
+    def __init__(self, recognizer: DollarPRecognizer,
+                 on_provisional_result: Optional[Callable[[ProvisionalResult], None]] = None,
+                 async_recognizer: Optional[AsyncGestureRecognizer] = None):
+        """
+        If an async recognizer (wrapping the same recognizer) is given, the provisional evaluations run on its worker
+        so update() never blocks the caller; on_provisional_result is then called on the worker thread.
+        """
+        self.recognizer = recognizer
+        self.on_provisional_result = on_provisional_result
+        self.async_recognizer = async_recognizer
+        # the results of asynchronous evaluations are set on the worker thread
+        self._lock = threading.Lock()
+        # incremented for every new gesture, so results that arrive late for an older gesture are ignored
+        self._gesture_id = 0
+        self.start()
+
+    def start(self):
+        """
+        Resets the state for a new gesture.
+        """
+        with self._lock:
+            self._gesture_id += 1
+            self.provisional_result: Optional[ProvisionalResult] = None
+        self._points = np.empty((self.INITIAL_CAPACITY, 2))
+        self._stroke_ids = np.empty(self.INITIAL_CAPACITY, dtype=object)
+        # the arc length from the first point to every point; points of different strokes are not connected
+        self._cumulative_lengths = np.empty(self.INITIAL_CAPACITY)
+        self._num_points = 0
+
+        self._num_points_at_last_update = 0  # number of points at the last evaluation that was started
+        self._last_seen_points = 0  # number of points at the last call of update()
+        self._evaluation_pending = False
+
+    def add_point(self, x, y, stroke_id=None):
+        if self._num_points == len(self._points):
+            self._grow_buffers()
+
+        i = self._num_points
+        self._points[i] = (x, y)
+        self._stroke_ids[i] = stroke_id
+        if i == 0:
+            self._cumulative_lengths[i] = 0.0
+        elif self._stroke_ids[i - 1] == stroke_id:
+            last_x, last_y = self._points[i - 1]
+            self._cumulative_lengths[i] = self._cumulative_lengths[i - 1] + np.hypot(x - last_x, y - last_y)
+        else:
+            # a new stroke has started
+            self._cumulative_lengths[i] = self._cumulative_lengths[i - 1]
+        self._num_points += 1
+
+    def _grow_buffers(self):
+        # double the capacity so appending a point stays O(1) amortized
+        new_capacity = 2 * len(self._points)
+        self._points = np.resize(self._points, (new_capacity, 2))
+        self._stroke_ids = np.resize(self._stroke_ids, new_capacity)
+        self._cumulative_lengths = np.resize(self._cumulative_lengths, new_capacity)
+
+    def update(self) -> Optional[ProvisionalResult]:
+        """
+        Should be called once per frame while the gesture is drawn. Re-evaluates the gesture if enough new points
+        were added or if no new points arrived since the last call (i.e. the player paused, probably right before
+        releasing the mouse). Returns the current provisional result.
+
+        With an async recognizer only one evaluation runs at a time, the points added meanwhile are evaluated once it
+        has finished.
+        """
+        new_points = self._num_points - self._num_points_at_last_update
+        if not self._evaluation_pending and (new_points >= self.EVALUATION_INTERVAL or (
+                new_points > 0 and self._num_points == self._last_seen_points)):
+            self._evaluate()
+        self._last_seen_points = self._num_points
+        return self.provisional_result
+
+    def finish(self) -> Optional[ProvisionalResult]:
+        """
+        Returns the final result if it is already known, i.e. if the last finished evaluation was based on exactly the
+        drawn points and found a template. Otherwise None is returned and the gesture has to be recognized as a whole
+        (e.g. asynchronously).
+        """
+        with self._lock:
+            if self.provisional_result is not None and self.provisional_result.num_points == self._num_points:
+                return self.provisional_result
+        return None
+
+    def _evaluate(self):
+        self._num_points_at_last_update = num_points = self._num_points
+        gesture_id = self._gesture_id
+        if num_points < 2 or self._cumulative_lengths[num_points - 1] == 0:
+            # nothing to recognize yet
+            self._on_evaluated(gesture_id, num_points, None)
+            return
+
+        resampled_points = self._resample(self.recognizer.NUM_RESAMPLED_POINTS)
+        if self.async_recognizer is None:
+            self._on_evaluated(gesture_id, num_points, self.recognizer.recognize_resampled(resampled_points))
+            return
+
+        # if the request is superseded (e.g. by the recognition of the finished gesture) or fails, no result arrives
+        # and no further evaluations are started for this gesture
+        self._evaluation_pending = True
+        self.async_recognizer.submit_method("recognize_resampled", (resampled_points,),
+                                            lambda result: self._on_evaluated(gesture_id, num_points, result))
+
+    def _on_evaluated(self, gesture_id: int, num_points: int, recognition_result: Optional[tuple[str, float]]):
+        with self._lock:
+            if gesture_id != self._gesture_id:
+                # the result belongs to a previous gesture
+                return
+            self._evaluation_pending = False
+            # a result of an evaluation that found nothing replaces the previous one as well, as that one is based on
+            # fewer points and can't be the final result anymore
+            if recognition_result is None:
+                self.provisional_result = None
+                return
+            template_name, score = recognition_result
+            self.provisional_result = ProvisionalResult(template_name, score, score > self.recognizer.THRESHOLD,
+                                                        num_points)
+            provisional_result = self.provisional_result
+
+        if self.on_provisional_result is not None:
+            self.on_provisional_result(provisional_result)
+
+    def _resample(self, n: int) -> list[Point]:
+        # the arc lengths are already known, so only the interpolation step of the resampling is left
+        resampled, segment_ends = resampling.resample_path(self._points[:self._num_points],
+                                                            self._cumulative_lengths[:self._num_points], n)
+        stroke_ids = self._stroke_ids[segment_ends]
+        return [Point(x, y, stroke_id) for (x, y), stroke_id in zip(resampled, stroke_ids)]
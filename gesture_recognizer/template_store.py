@@ -0,0 +1,289 @@
+"""
+Storage for the gesture templates of the $P and $Q recognizers. The JSON gesture file is the only source of the
+templates; every recognizer derives a template file of its own from it in the binary format from
+binary_template_format.py, as they normalize the samples differently. Every sample is normalized only once (when the
+template file is created or the sample is added), so predicting a gesture only has to pay for the actual matching.
+The template file contains the checksum of the gesture file it was derived from and is created again whenever the
+gesture file has changed (e.g. it was edited by hand or another recognizer has saved a gesture).
+
+A gesture can have any number of samples: the first one is stored as "original" (that's the one shown in the menu),
+all further ones in "additional_samples".
+"""
+
+import json
+import os
+import pathlib
+import sys
+from typing import Callable, NamedTuple, Optional
+import numpy as np
+from gesture_recognizer import binary_template_format
+
+
+class TemplateIndex(NamedTuple):
+    """
+    All samples of all gestures in one contiguous array, so they can be matched at once.
+    """
+    gesture_names: list[str]
+    sample_gestures: np.ndarray  # the index in gesture_names for every sample, shape (num_samples,)
+    points: np.ndarray  # the normalized samples, shape (num_samples, num_points, 2)
+
+
+def write_gesture_file(file_path: pathlib.Path, gestures: dict) -> bytes:
+    """
+    Writes the gestures to the JSON gesture file and returns the written data. The file is replaced at once, so it is
+    never left half written for the recognizers that share it. Raises an OSError if it can't be written.
+    """
+    # the indent parameter makes the file more human-readable
+    data = json.dumps(gestures, indent=2).encode("utf-8")
+    temp_file_path = file_path.with_name(file_path.name + ".tmp")
+    with open(temp_file_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file_path, file_path)
+    return data
+
+
+def limit_samples_per_gesture(template_index: TemplateIndex, max_samples: int) -> TemplateIndex:
+    """
+    Returns an index with at most max_samples samples per gesture (the index itself if no gesture has more). The
+    samples are chosen by farthest point sampling: starting with the original sample, the sample that is the most
+    different from all samples chosen so far is added next, so the chosen ones cover the variations of the gesture.
+    Two samples are compared by the mean distance between their points in the order of the resampled clouds, which is
+    much cheaper than matching them.
+    """
+    sample_counts = np.bincount(template_index.sample_gestures, minlength=len(template_index.gesture_names))
+    if sample_counts.max(initial=0) <= max_samples:
+        return template_index
+
+    chosen_samples = []
+    for gesture in range(len(template_index.gesture_names)):
+        samples = np.flatnonzero(template_index.sample_gestures == gesture)
+        if len(samples) <= max_samples:
+            chosen_samples.extend(samples)
+            continue
+        points = np.asarray(template_index.points[samples], dtype=float)
+        chosen = [0]
+        # the distance from every sample to the nearest chosen one
+        distances = np.linalg.norm(points - points[0], axis=2).mean(axis=1)
+        for _ in range(max_samples - 1):
+            chosen.append(int(np.argmax(distances)))
+            distances = np.minimum(distances, np.linalg.norm(points - points[chosen[-1]], axis=2).mean(axis=1))
+        chosen_samples.extend(samples[chosen])
+
+    # keep the order of the template file, so ties are still decided the same way
+    chosen_samples = np.sort(chosen_samples)
+    return TemplateIndex(template_index.gesture_names, template_index.sample_gestures[chosen_samples],
+                         template_index.points[chosen_samples])
+
+
+class TemplateStore:
+    """
+    Keeps the templates of the JSON gesture file together with their normalized samples. The normalized samples are
+    memory-mapped from the template file and used for matching without copying them, new samples are appended to the
+    template file without rewriting it.
+    """
+
+    def __init__(self, gesture_file_path: pathlib.Path, template_file_path: pathlib.Path,
+                 normalize_func: Callable[[list], np.ndarray], num_points: int):
+        """
+        The normalize function gets the raw points of a template in the form [[x, y], ...] and must return the
+        normalized point cloud as a numpy array with the shape (num_points, 2).
+        """
+        self._gesture_file_path = gesture_file_path
+        self._template_file_path = template_file_path
+        self._normalize_func = normalize_func
+        self._num_points = num_points
+        self._template_file = binary_template_format.BinaryTemplateFile(template_file_path)
+
+        # the gesture data in the same format as in the gesture file, i.e. {name: {"original": [...], ...}}
+        self.gestures: dict = {}
+        # all normalized samples in one index, usually a view on the memory-mapped template file
+        self._template_index: Optional[TemplateIndex] = None
+        # modification time and size of the gesture file when it was read, to notice when it has been changed
+        self._gesture_file_state: Optional[tuple[int, int]] = None
+        # the checksum of the gesture data the template file must have been derived from
+        self._source_checksum = binary_template_format.NO_SOURCE_CHECKSUM
+        # incremented whenever the index changes, so derived data (e.g. lookup tables) can be rebuilt without keeping
+        # a reference to the old index and its memory map
+        self.revision = 0
+        self.load()
+
+    def load(self):
+        self._close()
+        self._template_file.recover()
+        self._gesture_file_state = self._get_gesture_file_state()
+        data = b""
+        if self._gesture_file_state is not None:
+            try:
+                with open(self._gesture_file_path, 'rb') as f:
+                    data = f.read()
+                self.gestures.update(json.loads(data))
+            except (OSError, ValueError) as e:
+                sys.stderr.write(f"Couldn't load the gesture file '{self._gesture_file_path.name}': {e}\n")
+        else:
+            sys.stderr.write(f"Gesture file '{self._gesture_file_path.name}' does not exist yet!\n")
+
+        self._source_checksum = binary_template_format.calc_source_checksum(data)
+        if not self._is_template_file_up_to_date():
+            print(f"[INFO]: Creating '{self._template_file_path.name}' from '{self._gesture_file_path.name}'.")
+            self._write_template_file()
+        self._map_template_file()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Loads the templates again if the gesture file has been changed since it was read. Returns whether they were
+        loaded again.
+        """
+        if self._get_gesture_file_state() == self._gesture_file_state:
+            return False
+        self.load()
+        return True
+
+    def _get_gesture_file_state(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = self._gesture_file_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _is_template_file_up_to_date(self) -> bool:
+        if not self._template_file.exists():
+            return False
+        try:
+            return (self._template_file.read_num_points() == self._num_points
+                    and self._template_file.read_source_checksum() == self._source_checksum)
+        except (OSError, ValueError):
+            return False
+
+    def _close(self):
+        # drops the references to the memory-mapped files, so they are unmapped and can be replaced
+        self.gestures.clear()
+        self._template_index = None
+
+    def _get_normalized_samples(self) -> list[tuple[str, list, np.ndarray]]:
+        return [(gesture_name, sample, self._normalize_func(sample))
+                for gesture_name in self.gestures for sample in self.get_samples(gesture_name)]
+
+    def _write_template_file(self):
+        # the old files can't be replaced while they are still mapped
+        self._template_index = None
+        try:
+            self._template_file.write_all(self._get_normalized_samples(), self._num_points, self._source_checksum)
+        except (OSError, ValueError) as e:
+            # the templates are still usable, they are just normalized again the next time (e.g. a gesture name in a
+            # hand-edited gesture file that is too long for the template file)
+            sys.stderr.write(f"Couldn't save the template file '{self._template_file_path.name}': {e}\n")
+
+    def _map_template_file(self):
+        self._template_index = None
+        # an outdated template file (it couldn't be written) is never used
+        if not self._is_template_file_up_to_date():
+            self._build_template_index_in_memory()
+            return
+        try:
+            sample_records, _ = self._template_file.map()
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Couldn't load the template file '{self._template_file_path.name}': {e}\n")
+            self._build_template_index_in_memory()
+            return
+
+        gesture_indices = {}  # gesture name -> index in the list of gesture names
+        sample_gestures = np.empty(len(sample_records), dtype=int)
+        for i, sample_record in enumerate(sample_records):
+            gesture_name = sample_record["gesture_name"].decode("utf-8")
+            sample_gestures[i] = gesture_indices.setdefault(gesture_name, len(gesture_indices))
+
+        # a view on the memory-mapped file, nothing is copied
+        self._template_index = TemplateIndex(list(gesture_indices), sample_gestures, sample_records["points"])
+        self.revision += 1
+
+    def _build_template_index_in_memory(self):
+        # only used if the template file can't be written or read
+        samples = self._get_normalized_samples()
+        gesture_names = list(self.gestures)
+        sample_gestures = np.array([gesture_names.index(gesture_name) for gesture_name, _, _ in samples], dtype=int)
+        points = np.array([normalized_points for _, _, normalized_points in samples], dtype=np.float32)
+        self._template_index = TemplateIndex(gesture_names, sample_gestures,
+                                             points.reshape(len(samples), self._num_points, 2))
+        self.revision += 1
+
+    def _save_gesture_file(self) -> bool:
+        try:
+            data = write_gesture_file(self._gesture_file_path, self.gestures)
+        except OSError as e:
+            sys.stderr.write(f"Couldn't save the gesture file '{self._gesture_file_path.name}': {e}\n")
+            return False
+        self._gesture_file_state = self._get_gesture_file_state()
+        self._source_checksum = binary_template_format.calc_source_checksum(data)
+        return True
+
+    def get_samples(self, gesture_name: str) -> list:
+        gesture_data = self.gestures[gesture_name]
+        return [gesture_data["original"]] + gesture_data.get("additional_samples", [])
+
+    def get_num_samples(self, gesture_name: str) -> int:
+        return len(self.get_samples(gesture_name))
+
+    def _check_gesture_name(self, gesture_name: str) -> bool:
+        try:
+            binary_template_format.check_gesture_name(gesture_name)
+        except ValueError as e:
+            sys.stderr.write(f"Couldn't save the gesture: {e}\n")
+            return False
+        return True
+
+    def set_template(self, gesture_name: str, gesture_points: list) -> bool:
+        # nothing is saved for a name that doesn't fit into the template file
+        if not self._check_gesture_name(gesture_name):
+            return False
+        # changes of the gesture file (e.g. by another recognizer) must not be overwritten
+        self.reload_if_changed()
+        if gesture_name not in self.gestures:
+            # nothing has to be replaced, so the new gesture can simply be appended
+            return self.add_sample(gesture_name, gesture_points)
+
+        self.gestures[gesture_name] = {"original": gesture_points}
+        if not self._save_gesture_file():
+            self.load()
+            return False
+        # replacing samples is the only case where the whole template file is rewritten
+        self._write_template_file()
+        self._map_template_file()
+        return True
+
+    def add_sample(self, gesture_name: str, gesture_points: list) -> bool:
+        if not self._check_gesture_name(gesture_name):
+            return False
+        self.reload_if_changed()
+        # a template file that couldn't be written before can't be appended to
+        can_append = self._is_template_file_up_to_date()
+        if gesture_name not in self.gestures:
+            self.gestures[gesture_name] = {"original": gesture_points}
+        else:
+            self.gestures[gesture_name].setdefault("additional_samples", []).append(gesture_points)
+        if not self._save_gesture_file():
+            # drop the sample again
+            self.load()
+            return False
+
+        if not can_append:
+            self._write_template_file()
+            self._map_template_file()
+            return True
+        try:
+            self._template_file.append_sample(gesture_name, gesture_points, self._normalize_func(gesture_points))
+            self._template_file.write_source_checksum(self._source_checksum)
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Couldn't append to the template file '{self._template_file_path.name}': {e}\n")
+            self._write_template_file()
+        # map the file again so the new sample is included
+        self._map_template_file()
+        return True
+
+    def get_template_index(self) -> TemplateIndex:
+        return self._template_index
+
+    def __contains__(self, gesture_name):
+        return gesture_name in self.gestures
+
+    def __len__(self):
+        return len(self.gestures)
@@ -4,7 +4,9 @@
 import argparse
 import random
 import pygame
+import DIPPID
 from game.super_dippid_boy import SuperDippidBoy
+from gesture_recognizer import recognizer_registry
 
 
 # check imports
@@ -21,8 +23,12 @@ def main():
         print("[INFO]: You are in DEBUG mode at the moment!")
         random.seed(42)  # set a random seed to make the game deterministic while testing
 
+    # ctrl+c disconnects the DIPPID sensor and quits the game
+    DIPPID.install_interrupt_handler()
     pygame.init()  # setup and initialize pygame
-    game = SuperDippidBoy(debug_active=debug_mode_enabled, dippid_port=port)
+    game = SuperDippidBoy(debug_active=debug_mode_enabled, dippid_port=port, recognition_worker=args.recognition_worker,
+                          recognizer_backend=args.recognizer, sensor_transport=args.sensor_transport,
+                          render_mode=args.render_mode, sensor_filter=not args.no_sensor_filter)
     game.show_start_screen()
 
 
@@ -35,6 +41,19 @@ if __name__ == "__main__":
                                               "where new gestures can be added", action="store_true", default=False)
     parser.add_argument("-p", "--port", help="The port on which the DIPPID device sends the data", type=int,
                         default=5700, required=False)
+    parser.add_argument("--recognition-worker", help="Whether gestures are recognized on a worker thread or a worker "
+                                                     "process", choices=["thread", "process"], default="thread")
+    parser.add_argument("--recognizer", help="The gesture recognizer backend", default="dollar_p",
+                        choices=recognizer_registry.get_backend_names())
+    parser.add_argument("--sensor-transport", help="Whether the DIPPID data is received on a thread of its own or "
+                                                   "on an asyncio event loop", choices=["thread", "asyncio"],
+                        default="thread")
+    parser.add_argument("--render-mode", help="Whether the whole screen is redrawn every frame or only the areas that "
+                                              "changed (the background doesn't scroll then); in debug mode the "
+                                              "frame times are printed after every game", choices=["flip", "dirty"], default="flip")
+    parser.add_argument("--no-sensor-filter", help="Use the raw tilt of the latest DIPPID packet instead of smoothing "
+                                                   "and extrapolating it over the last received values",
+                        action="store_true", default=False)
     args = parser.parse_args()
 
     main()
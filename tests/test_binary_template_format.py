@@ -0,0 +1,56 @@
+"""
+Tests for the binary template files, in particular that an interrupted rewrite never combines the sample file with
+the raw point file of another write.
+"""
+
+import os
+import numpy as np
+import pytest
+from gesture_recognizer import binary_template_format
+from gesture_recognizer.binary_template_format import BinaryTemplateFile
+
+NUM_POINTS = 4
+
+
+def create_samples(gesture_names):
+    return [(name, [[float(i), float(i + len(name))] for i in range(3 + len(name))], np.full((NUM_POINTS, 2), i))
+            for i, name in enumerate(gesture_names)]
+
+
+def write_all_interrupted(template_file, samples):
+    # same as write_all() up to the point where the raw point file has been replaced, but not the sample file
+    temp_file = BinaryTemplateFile(binary_template_format.get_temp_file_path(template_file.file_path))
+    temp_file.create(NUM_POINTS)
+    for sample in samples:
+        temp_file.append_sample(*sample)
+    os.replace(temp_file.raw_file_path, template_file.raw_file_path)
+
+
+def read_samples(template_file):
+    sample_records, raw_points = template_file.map()
+    return [(record["gesture_name"].decode(), binary_template_format.get_raw_points(record, raw_points))
+            for record in sample_records]
+
+
+def test_append_and_write_all(tmp_path):
+    template_file = BinaryTemplateFile(tmp_path / "gestures.gtpl")
+    template_file.create(NUM_POINTS)
+    for sample in create_samples(["circle", "triangle"]):
+        template_file.append_sample(*sample)
+    template_file.write_all(create_samples(["rectangle"]), NUM_POINTS)
+
+    assert read_samples(template_file) == [(name, raw_points)
+                                                for name, raw_points, _ in create_samples(["rectangle"])]
+
+
+def test_interrupted_write_is_detected_and_recovered(tmp_path):
+    template_file = BinaryTemplateFile(tmp_path / "gestures.gtpl")
+    template_file.write_all(create_samples(["circle", "triangle"]), NUM_POINTS)
+    write_all_interrupted(template_file, create_samples(["rectangle"]))
+
+    with pytest.raises(ValueError):
+        template_file.map()
+
+    template_file.recover()
+    assert read_samples(template_file) == [(name, raw_points)
+                                                for name, raw_points, _ in create_samples(["rectangle"])]
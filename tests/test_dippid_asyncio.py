@@ -0,0 +1,35 @@
+"""
+Tests for the asyncio sensors: iterating the samples of a sensor that hasn't been started fails clearly, and received
+datagrams carry their receive time.
+"""
+
+import asyncio
+import socket
+import time
+import pytest
+from dippid_asyncio import SensorUDPAsync
+
+
+def test_samples_before_start_raise_an_error():
+    async def iterate_samples():
+        async for _ in SensorUDPAsync(0, ip='127.0.0.1').samples():
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(asyncio.wait_for(iterate_samples(), 1.0))
+
+
+def test_datagrams_are_received_with_their_receive_time():
+    async def receive_one():
+        async with SensorUDPAsync(0, ip='127.0.0.1') as sensor:
+            port = sensor._transport.get_extra_info('sockname')[1]
+            send_time = time.perf_counter()
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.sendto(b'{"button_1": 1}', ('127.0.0.1', port))
+            async for snapshot in sensor.samples():
+                return send_time, snapshot
+
+    send_time, snapshot = asyncio.run(asyncio.wait_for(receive_one(), 2.0))
+    assert snapshot.get_value('button_1') == 1
+    # taken when the datagram arrived, before it was parsed and published
+    assert send_time <= snapshot.receive_timestamp < snapshot.timestamp
@@ -0,0 +1,39 @@
+"""
+Tests that coalescing a batch of packets only merges the values of continuous capabilities, every change of a button
+reaches the callbacks.
+"""
+
+import json
+import DIPPID
+
+
+def create_packet(button_1, x):
+    return json.dumps({'button_1': button_1, 'accelerometer': {'x': x, 'y': 0, 'z': 0}}).encode()
+
+
+def test_button_press_and_release_in_one_batch_are_both_dispatched():
+    sensor = DIPPID.Sensor()
+    sensor._update_coalesced([create_packet(0, 0.0)])
+    button_values = []
+    accelerometer_values = []
+    sensor.register_callback('button_1', button_values.append)
+    sensor.register_callback('accelerometer', lambda value: accelerometer_values.append(value['x']))
+
+    sensor._update_coalesced([create_packet(0, 0.1), create_packet(1, 0.2), create_packet(1, 0.3),
+                              create_packet(0, 0.4), create_packet(0, 0.5), create_packet(0, 0.6)])
+
+    assert button_values == [1, 0]
+    # the continuous values between the button changes are still coalesced
+    assert accelerometer_values == [0.2, 0.4, 0.6]
+    assert sensor.get_value('button_1') == 0
+
+
+def test_sensor_without_buttons_only_parses_the_newest_packets():
+    sensor = DIPPID.Sensor()
+    packets = [json.dumps({'accelerometer': {'x': x, 'y': 0, 'z': 0}}).encode() for x in range(5)]
+    sensor._update_coalesced(packets[:1])
+    accelerometer_values = []
+    sensor.register_callback('accelerometer', lambda value: accelerometer_values.append(value['x']))
+
+    assert sensor._update_coalesced(packets) == 1
+    assert accelerometer_values == [4]
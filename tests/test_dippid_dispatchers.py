@@ -0,0 +1,24 @@
+"""
+Tests for the bookkeeping of the callback dispatchers: jobs that were dropped (e.g. because their event got lost) are
+never run afterwards and don't block new values of a coalesced callback.
+"""
+
+import DIPPID
+
+
+def test_discarded_jobs_are_not_run_and_dont_block_coalesced_callbacks():
+    dispatcher = DIPPID.CallbackDispatcher()
+    values = []
+    lost_job = dispatcher._queue_job(values.append, 1, coalesce_key='key')
+    # merged into the waiting job
+    assert dispatcher._queue_job(values.append, 2, coalesce_key='key') is None
+
+    assert dispatcher.discard_pending_jobs() == 1
+    assert dispatcher.queue_depth == 0
+    # e.g. the event of the job arrives after all
+    dispatcher._run_job(lost_job)
+    assert values == []
+
+    dispatcher.dispatch(values.append, 3, coalesce_key='key')
+    assert values == [3]
+    assert dispatcher.get_stats()['queue_depth'] == 0
@@ -0,0 +1,20 @@
+"""
+Tests that the sensor history records the values with the time they were received.
+"""
+
+import json
+import DIPPID
+from dippid_history import SensorHistory
+
+
+def test_values_are_recorded_with_their_receive_time():
+    sensor = DIPPID.Sensor()
+    history = SensorHistory(sensor)
+    for receive_timestamp, x in [(10.0, 0.1), (10.01, 0.2), (10.02, 0.3)]:
+        sensor.feed_packet(json.dumps({'gravity': {'x': x, 'y': 9.7, 'z': 0.4}}).encode(), receive_timestamp)
+
+    timestamps, values = history.get_window('gravity')
+    assert timestamps.tolist() == [10.0, 10.01, 10.02]
+    assert values[:, 0].tolist() == [0.1, 0.2, 0.3]
+    # the line through the values, extrapolated to the given time
+    assert abs(history.get_filtered('gravity', 'x', time=10.03, max_extrapolation=0.05) - 0.4) < 1e-9
@@ -0,0 +1,115 @@
+"""
+Tests for SensorSerial with the simulated device of dippid_serial_device.py (a pseudo terminal): lines that arrive in
+several parts, garbage between the lines and reconnecting with a growing delay after the device was unplugged.
+"""
+
+import os
+import time
+import pytest
+
+pytest.importorskip("termios")  # pseudo terminals are only available on Linux and macOS
+pytest.importorskip("serial")
+
+import DIPPID
+from dippid_serial_device import open_device
+
+
+class FastSensorSerial(DIPPID.SensorSerial):
+    """
+    Shorter timeouts and lines than in production to keep the tests fast, and records the attempts to open the device.
+    """
+    READ_TIMEOUT = 0.02
+    RECONNECT_MIN_DELAY = 0.05
+    RECONNECT_MAX_DELAY = 0.4
+    MAX_LINE_LENGTH = 64
+
+    def __init__(self, tty):
+        self.open_times = []
+        DIPPID.SensorSerial.__init__(self, tty)
+
+    def _open(self):
+        self.open_times.append(time.perf_counter())
+        DIPPID.SensorSerial._open(self)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def device(tmp_path):
+    link_path = str(tmp_path / "dippid-tty")
+    file_descriptors = list(open_device(link_path))
+    yield link_path, file_descriptors
+    for fd in file_descriptors:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def sensor(device):
+    sensor = FastSensorSerial(device[0])
+    yield sensor
+    sensor.disconnect()
+
+
+def test_line_in_several_parts_is_applied_once_complete(device, sensor):
+    master_fd = device[1][0]
+    os.write(master_fd, b'{"button_1": 1, "accelerometer": {"x": 0.5,')
+    time.sleep(0.1)
+    assert sensor.get_value('button_1') is None
+
+    os.write(master_fd, b' "y": 0, "z": 0}}\n{"button_1"')
+    assert wait_until(lambda: sensor.get_value('button_1') == 1)
+    assert sensor.get_value('accelerometer')['x'] == 0.5
+    os.write(master_fd, b': 0}\n')
+    assert wait_until(lambda: sensor.get_value('button_1') == 0)
+    assert sensor.get_receive_stats()['lines_dropped'] == 0
+
+
+def test_framing_resyncs_after_garbage(device, sensor):
+    master_fd = device[1][0]
+    # a broken line and more garbage without a line break than fits into the buffer
+    os.write(master_fd, b'{"button_1": \x00\xff\n' + b'x' * 2 * FastSensorSerial.MAX_LINE_LENGTH)
+    assert wait_until(lambda: sensor.get_receive_stats()['lines_dropped'] >= 1)
+
+    # the rest of the garbage line ends with the next line break, the line after it is read as usual
+    os.write(master_fd, b'xxx\n{"button_1": 1}\n')
+    assert wait_until(lambda: sensor.get_value('button_1') == 1)
+
+
+def test_reconnects_with_growing_delay(device, sensor):
+    link_path, file_descriptors = device
+    os.write(file_descriptors[0], b'{"button_1": 1}\n')
+    assert wait_until(lambda: sensor.get_value('button_1') == 1)
+
+    # unplug the device: the pseudo terminal is gone and the link points nowhere
+    for fd in file_descriptors:
+        os.close(fd)
+    file_descriptors.clear()
+    os.remove(link_path)
+    assert wait_until(lambda: sensor.get_receive_stats()['reconnects'] == 1)
+    # the first attempt was the connection when the sensor was created, the others are the failed reconnects
+    assert wait_until(lambda: len(sensor.open_times) >= 7, timeout=3.0)
+    failed_attempts = sensor.open_times[1:]
+
+    # the delay doubles after every failed attempt up to the maximum
+    delays = [later - earlier for earlier, later in zip(failed_attempts, failed_attempts[1:])]
+    assert delays[0] >= FastSensorSerial.RECONNECT_MIN_DELAY
+    assert all(later > earlier * 1.5 or later >= FastSensorSerial.RECONNECT_MAX_DELAY
+               for earlier, later in zip(delays, delays[1:]))
+    assert max(delays) < FastSensorSerial.RECONNECT_MAX_DELAY + 0.1
+
+    # plug it in again behind the same link
+    file_descriptors.extend(open_device(link_path))
+    assert wait_until(lambda: sensor._serial is not None, timeout=3.0)
+    os.write(file_descriptors[0], b'{"button_1": 0}\n')
+    assert wait_until(lambda: sensor.get_value('button_1') == 0)
+    assert sensor.get_receive_stats()['reconnects'] == 1
@@ -0,0 +1,36 @@
+"""
+Tests that a SensorUDP can be disconnected while the device doesn't send anything, and that importing DIPPID leaves
+ctrl+c to the program.
+"""
+
+import signal
+import socket
+import time
+import DIPPID
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_importing_dippid_doesnt_install_an_interrupt_handler():
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+
+
+def test_disconnect_doesnt_block_without_packets():
+    for batched in (True, False):
+        port = get_free_port()
+        sensor = DIPPID.SensorUDP(port, ip='127.0.0.1', batched=batched)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'{"button_1": 0}', ('127.0.0.1', port))
+        deadline = time.perf_counter() + 2
+        while not sensor.has_capability('button_1') and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert sensor.get_value('button_1') == 0
+
+        start_time = time.perf_counter()
+        sensor.disconnect()
+        assert time.perf_counter() - start_time < 2 * DIPPID.SensorUDP.RECEIVE_TIMEOUT
+        assert not sensor._connection_thread.is_alive()
@@ -0,0 +1,64 @@
+"""
+Checks that the vectorized $P matching in dollar_p_matching.py gives the same results as the reference implementation
+in DollarPRecognizer.
+"""
+
+import pathlib
+import numpy as np
+import pytest
+from gesture_recognizer import dollar_p_matching
+from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer, Point
+
+NUM_TEMPLATES = 24
+
+
+@pytest.fixture
+def reference_recognizer(tmp_path):
+    # an empty template file, only the matching functions of the recognizer are used
+    return DollarPRecognizer(matching_backend="reference", template_file_path=tmp_path / "gestures.gtpl",
+                             gesture_file_path=tmp_path / "gestures.json")
+
+
+def create_clouds(seed):
+    rng = np.random.default_rng(seed)
+    n = DollarPRecognizer.NUM_RESAMPLED_POINTS
+    return rng.uniform(-1, 1, (n, 2)), rng.uniform(-1, 1, (NUM_TEMPLATES, n, 2))
+
+
+def calc_reference_distances(recognizer, points, templates):
+    drawn_points = [Point(x, y) for x, y in points]
+    return np.array([recognizer.greedy_cloud_match(drawn_points, [Point(x, y) for x, y in template])
+                     for template in templates])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_greedy_cloud_match_batch_equals_reference(reference_recognizer, seed):
+    points, templates = create_clouds(seed)
+    expected_distances = calc_reference_distances(reference_recognizer, points, templates)
+
+    np.testing.assert_allclose(dollar_p_matching.greedy_cloud_match_batch(points, templates), expected_distances,
+                               rtol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("k", [1, 3])
+def test_find_nearest_matches_equals_reference(reference_recognizer, seed, k):
+    points, templates = create_clouds(seed)
+    expected_distances = calc_reference_distances(reference_recognizer, points, templates)
+    expected_templates = np.argsort(expected_distances, kind='stable')[:k]
+
+    nearest_templates, distances = dollar_p_matching.find_nearest_matches(points, templates, k)
+
+    np.testing.assert_array_equal(nearest_templates, expected_templates)
+    np.testing.assert_allclose(distances, expected_distances[expected_templates], rtol=1e-9)
+
+
+def test_no_match_if_no_distance_is_finite(tmp_path, monkeypatch):
+    recognizer = DollarPRecognizer(template_file_path=tmp_path / "gestures.gtpl",
+                                   gesture_file_path=pathlib.Path("gesture_recognizer") / "gestures.json")
+    # e.g. a drawn gesture whose points are all nan
+    monkeypatch.setattr(dollar_p_matching, "find_nearest_matches",
+                        lambda points, templates, k: (np.arange(k), np.full(k, np.inf)))
+
+    drawn_points = [Point(x, y) for x, y in create_clouds(0)[0]]
+    assert recognizer.recognize(drawn_points) is None
@@ -0,0 +1,80 @@
+"""
+Checks that only a limited number of samples per gesture is matched by the recognizers with hundreds of samples per
+gesture, so recognizing stays within their latency budget. Measuring the latency itself depends on the machine and its
+load, so that test only runs with RUN_TIMING_TESTS=1 in the environment.
+"""
+
+import json
+import os
+import pathlib
+import statistics
+import time
+import numpy as np
+import pytest
+from gesture_recognizer.benchmark import generate_gesture
+from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer
+from gesture_recognizer.dollar_q_recognizer import DollarQRecognizer
+
+SAMPLES_PER_GESTURE = 300
+GESTURE_FILE_PATH = pathlib.Path("gesture_recognizer") / "gestures.json"
+
+
+@pytest.fixture(scope="module")
+def templates():
+    with open(GESTURE_FILE_PATH, 'r') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def large_gesture_file_path(tmp_path_factory, templates):
+    rng = np.random.default_rng(0)
+    gestures = {}
+    for gesture_name, gesture_data in templates.items():
+        samples = [generate_gesture(gesture_data["original"], rng, noise=4.0, rotation=15.0)
+                   for _ in range(SAMPLES_PER_GESTURE - 1)]
+        gestures[gesture_name] = {"original": gesture_data["original"],
+                                  "additional_samples": [[[x, y] for x, y, _ in sample] for sample in samples]}
+    file_path = tmp_path_factory.mktemp("gestures") / "gestures.json"
+    file_path.write_text(json.dumps(gestures))
+    return file_path
+
+
+def create_recognizer(recognizer_class, large_gesture_file_path):
+    recognizer = recognizer_class(template_file_path=large_gesture_file_path.with_name(recognizer_class.__name__),
+                                  gesture_file_path=large_gesture_file_path)
+    # every prediction has to be recognized, not taken from the cache
+    recognizer.recognition_cache.max_size = 0
+    return recognizer
+
+
+def generate_gestures(templates):
+    rng = np.random.default_rng(1)
+    return [(gesture_name, generate_gesture(gesture_data["original"], rng, noise=4.0, rotation=15.0))
+            for gesture_name, gesture_data in templates.items() for _ in range(5)]
+
+
+@pytest.mark.parametrize("recognizer_class", [DollarPRecognizer, DollarQRecognizer])
+def test_only_a_limited_number_of_samples_is_matched(recognizer_class, large_gesture_file_path, templates):
+    recognizer = create_recognizer(recognizer_class, large_gesture_file_path)
+    gestures = generate_gestures(templates)
+    num_correct = sum(recognizer.predict(gesture_points).template_name == gesture_name
+                      for gesture_name, gesture_points in gestures)
+
+    matched_index = recognizer._get_template_index()
+    samples_per_gesture = np.bincount(matched_index.sample_gestures)
+    assert len(samples_per_gesture) == len(templates)
+    assert samples_per_gesture.max() <= recognizer.MAX_MATCHED_SAMPLES
+    assert num_correct >= 0.9 * len(gestures)
+
+
+@pytest.mark.skipif(os.environ.get("RUN_TIMING_TESTS") != "1", reason="timing test, set RUN_TIMING_TESTS=1 to run it")
+@pytest.mark.parametrize("recognizer_class", [DollarPRecognizer, DollarQRecognizer])
+def test_recognition_stays_within_the_latency_budget(recognizer_class, large_gesture_file_path, templates):
+    recognizer = create_recognizer(recognizer_class, large_gesture_file_path)
+    latencies = []
+    for _, gesture_points in generate_gestures(templates):
+        start = time.perf_counter()
+        recognizer.predict(gesture_points)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    assert statistics.median(latencies) <= recognizer.LATENCY_BUDGET_MS
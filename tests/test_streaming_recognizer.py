@@ -0,0 +1,87 @@
+"""
+Tests for the provisional results of the StreamingGestureRecognizer, with a stub recognizer that returns predefined
+results so the tests don't depend on the gesture templates.
+"""
+
+import threading
+from gesture_recognizer.async_recognizer import AsyncGestureRecognizer
+from gesture_recognizer.streaming_recognizer import StreamingGestureRecognizer
+
+
+class StubRecognizer:
+    NUM_RESAMPLED_POINTS = 32
+    THRESHOLD = 0.3
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.release = threading.Event()
+        self.release.set()
+
+    def recognize_resampled(self, resampled_points):
+        self.release.wait(5)
+        return self.results.pop(0)
+
+
+def add_points(streaming_recognizer, num_points, offset=0):
+    for i in range(offset, offset + num_points):
+        streaming_recognizer.add_point(i * 3, (i % 7) * 5, 0)
+
+
+def test_finish_returns_result_of_final_points():
+    streaming_recognizer = StreamingGestureRecognizer(StubRecognizer([("rectangle", 0.9)]))
+    add_points(streaming_recognizer, 8)
+    streaming_recognizer.update()
+
+    final_result = streaming_recognizer.finish()
+    assert final_result.template_name == "rectangle" and final_result.accepted and final_result.num_points == 8
+
+
+def test_finish_ignores_result_of_fewer_points():
+    streaming_recognizer = StreamingGestureRecognizer(StubRecognizer([("rectangle", 0.9)]))
+    add_points(streaming_recognizer, 8)
+    streaming_recognizer.update()
+    add_points(streaming_recognizer, 2, offset=8)
+
+    assert streaming_recognizer.finish() is None
+
+
+def test_evaluation_without_match_replaces_previous_result():
+    streaming_recognizer = StreamingGestureRecognizer(StubRecognizer([("rectangle", 0.99999), None]))
+    add_points(streaming_recognizer, 8)
+    streaming_recognizer.update()
+    # scribbling on until nothing matches anymore
+    add_points(streaming_recognizer, 8, offset=8)
+    assert streaming_recognizer.update() is None
+
+    assert streaming_recognizer.finish() is None
+
+
+def test_async_evaluation_doesnt_block_and_ignores_old_gestures():
+    recognizer = StubRecognizer([("circle", 0.8), ("triangle", 0.8)])
+    async_recognizer = AsyncGestureRecognizer(recognizer)
+    results = []
+    evaluated = threading.Event()
+
+    def on_provisional_result(result):
+        results.append(result)
+        evaluated.set()
+
+    streaming_recognizer = StreamingGestureRecognizer(recognizer, on_provisional_result=on_provisional_result,
+                                                      async_recognizer=async_recognizer)
+    try:
+        recognizer.release.clear()
+        add_points(streaming_recognizer, 8)
+        # returns immediately although the evaluation is still running
+        assert streaming_recognizer.update() is None
+
+        # a new gesture is started before the result of the first one has arrived
+        streaming_recognizer.start()
+        add_points(streaming_recognizer, 8)
+        streaming_recognizer.update()
+        recognizer.release.set()
+        assert evaluated.wait(5)
+
+        assert [result.template_name for result in results] == ["triangle"]
+        assert streaming_recognizer.finish().template_name == "triangle"
+    finally:
+        async_recognizer.shutdown()
@@ -0,0 +1,99 @@
+"""
+Tests that the JSON gesture file is the only source of the templates: the template files of the $P and $Q recognizers
+are derived from it and created again when it changes.
+"""
+
+import json
+import pytest
+from gesture_recognizer.dollar_one_recognizer import DollarOneRecognizer
+from gesture_recognizer.dollar_p_recognizer import DollarPRecognizer
+from gesture_recognizer.dollar_q_recognizer import DollarQRecognizer
+
+LINE = [[float(i), 0.0] for i in range(10)]
+V_SHAPE = [[float(i), float(abs(i - 5))] for i in range(11)]
+SQUARE = [[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0], [0.0, 0.0]]
+
+
+@pytest.fixture
+def gesture_file_path(tmp_path):
+    file_path = tmp_path / "gestures.json"
+    file_path.write_text(json.dumps({"line": {"original": LINE}, "v": {"original": V_SHAPE}}))
+    return file_path
+
+
+def create_recognizers(gesture_file_path):
+    p_recognizer = DollarPRecognizer(template_file_path=gesture_file_path.with_name("gestures.gtpl"),
+                                     gesture_file_path=gesture_file_path)
+    q_recognizer = DollarQRecognizer(template_file_path=gesture_file_path.with_name("gestures_q.gtpl"),
+                                     gesture_file_path=gesture_file_path)
+    return p_recognizer, q_recognizer
+
+
+def test_template_files_are_derived_from_the_gesture_file(gesture_file_path):
+    for recognizer in create_recognizers(gesture_file_path):
+        assert recognizer.template_store.get_template_index().gesture_names == ["line", "v"]
+        assert recognizer.predict(V_SHAPE).template_name == "v"
+
+
+def test_edited_gesture_file_is_loaded_again(gesture_file_path):
+    recognizers = create_recognizers(gesture_file_path)
+    for recognizer in recognizers:
+        recognizer.predict(SQUARE)
+
+    gestures = json.loads(gesture_file_path.read_text())
+    gestures["square"] = {"original": SQUARE}
+    gesture_file_path.write_text(json.dumps(gestures))
+
+    for recognizer in recognizers:
+        # the cached result was recognized with the old templates
+        assert recognizer.predict(SQUARE).template_name == "square"
+    # the template files are up to date again, so a new recognizer doesn't have to create them
+    for recognizer in create_recognizers(gesture_file_path):
+        assert recognizer.template_store.get_template_index().gesture_names == ["line", "v", "square"]
+
+
+def test_saved_gesture_is_seen_by_the_other_recognizer(gesture_file_path):
+    p_recognizer, q_recognizer = create_recognizers(gesture_file_path)
+    assert p_recognizer.add_template("square", SQUARE)
+    assert p_recognizer.add_template("line", LINE[::-1])
+
+    gestures = json.loads(gesture_file_path.read_text())
+    assert gestures["square"] == {"original": SQUARE}
+    assert gestures["line"]["additional_samples"] == [LINE[::-1]]
+    assert q_recognizer.predict(SQUARE).template_name == "square"
+    assert q_recognizer.template_store.get_num_samples("line") == 2
+
+    # a gesture saved by the $Q recognizer doesn't lose the ones of the $P recognizer
+    assert q_recognizer.template_store.set_template("v", V_SHAPE[::-1])
+    assert list(json.loads(gesture_file_path.read_text())) == ["line", "v", "square"]
+
+
+def test_too_long_gesture_name_is_rejected(gesture_file_path):
+    p_recognizer, _ = create_recognizers(gesture_file_path)
+    gesture_file = gesture_file_path.read_bytes()
+    assert not p_recognizer.add_template("a" * 33, SQUARE)
+    assert gesture_file_path.read_bytes() == gesture_file
+
+    # a name that is too long for the template files (e.g. edited by hand) doesn't stop the recognizers from loading
+    gestures = json.loads(gesture_file)
+    gestures["b" * 33] = {"original": SQUARE}
+    gesture_file_path.write_text(json.dumps(gestures))
+    for recognizer in create_recognizers(gesture_file_path):
+        assert recognizer.predict(SQUARE).template_name == "b" * 33
+
+
+def test_dollar_one_recognizer_keeps_the_samples_of_the_other_recognizers(tmp_path, monkeypatch):
+    # the $1 recognizer always uses gesture_recognizer/gestures.json in the working directory
+    gesture_file_path = tmp_path / "gesture_recognizer" / "gestures.json"
+    gesture_file_path.parent.mkdir()
+    gesture_file_path.write_text(json.dumps({"line": {"original": LINE}}))
+    monkeypatch.chdir(tmp_path)
+    p_recognizer, _ = create_recognizers(gesture_file_path)
+    assert p_recognizer.add_template("line", LINE[::-1])
+
+    assert DollarOneRecognizer().add_template("line", V_SHAPE)
+    line = json.loads(gesture_file_path.read_text())["line"]
+    assert line["original"] == V_SHAPE
+    assert line["additional_samples"] == [LINE[::-1]]
+    assert "normalized" in line
+    assert not gesture_file_path.with_name("gestures.json.tmp").exists()